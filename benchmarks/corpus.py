@@ -0,0 +1,152 @@
+"""Synthetic prescription corpus with known ground truth.
+
+Prescriptions are drawn from the medicine lexicon (names and brand aliases)
+and rendered as noisy, slightly rotated "handwritten-style" scans using a
+local font. Everything is seeded, so a seed always yields the same corpus.
+
+    python benchmarks/corpus.py out_dir/ [--count 50] [--seed 7]
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import random
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LEXICON = os.path.join(ROOT, "data", "medicines.csv")
+
+FONT_DIRS = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts"),
+             "/Library/Fonts", "/System/Library/Fonts", "C:\\Windows\\Fonts"]
+HANDWRITING_HINTS = ("hand", "script", "comic", "marker", "kalam", "caveat", "indie", "italic")
+
+DOSAGES = ["250mg", "500mg", "650mg", "125 mg", "5ml", "10 ml", "20mg", "40mg", "1g"]
+FREQUENCIES = ["once daily", "twice daily", "thrice daily", "1-0-1", "1-1-1", "0-0-1",
+               "bd", "tds", "od", "3 times a day"]
+DURATIONS = ["3 days", "5 days", "7 days", "10 days", "2 weeks", "1 month"]
+ROUTES = ["Tab", "Tab.", "Cap", "Syp", ""]
+LINE_TEMPLATES = [
+    "{route} {name} {dosage} {frequency} x {duration}",
+    "{index}. {name} {dosage} - {frequency} - {duration}",
+    "{route} {name} {dosage} {frequency} for {duration}",
+]
+HEADER_LINES = ["City Care Clinic", "Dr. A. Menon MBBS", "Rx", "Patient: {patient}", "Date: {day}/10/2026"]
+PATIENTS = ["Rahul Kumar", "Priya Sharma", "Amit Patel", "Sneha Reddy"]
+
+def load_drug_names(path=DEFAULT_LEXICON):
+    """Every lexicon name and alias, as written on a prescription"""
+    names = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            names.append(row['name'])
+            names.extend(alias[0].upper() + alias[1:]
+                         for alias in (row.get('aliases') or '').split('|') if alias)
+    return sorted(set(names))
+
+def find_font(path=None):
+    """A local TrueType font, preferring handwriting-like faces (None means Pillow's built-in font)"""
+    if path:
+        return path
+    candidates = []
+    for font_dir in FONT_DIRS:
+        candidates.extend(glob.glob(os.path.join(font_dir, "**", "*.[ot]tf"), recursive=True))
+    hinted = [c for c in candidates if any(hint in os.path.basename(c).lower() for hint in HANDWRITING_HINTS)]
+    return (sorted(hinted) or sorted(candidates) or [None])[0]
+
+def make_prescription(rng, drug_names, index):
+    """Ground truth plus the text lines written on the prescription"""
+    medicines = []
+    for name in rng.sample(drug_names, rng.randint(1, 4)):
+        medicines.append({
+            'name': name,
+            'dosage': rng.choice(DOSAGES),
+            'frequency': rng.choice(FREQUENCIES),
+            'duration': rng.choice(DURATIONS),
+        })
+    header = [line.format(patient=rng.choice(PATIENTS), day=rng.randint(1, 28))
+              for line in HEADER_LINES if rng.random() < 0.7]
+    template = rng.choice(LINE_TEMPLATES)
+    lines = [' '.join(template.format(route=rng.choice(ROUTES), index=i + 1, **med).split())
+             for i, med in enumerate(medicines)]
+    return {'id': f"rx{index:04d}", 'medicines': medicines, 'lines': header + lines}
+
+def add_typos(rng, text, rate=0.08):
+    """OCR-style slips in longer words: a dropped, doubled or swapped letter"""
+    words = []
+    for word in text.split(' '):
+        if len(word) >= 6 and word.isalpha() and rng.random() < rate * len(word) / 4:
+            i = rng.randrange(1, len(word) - 1)
+            slip = rng.choice(('drop', 'double', 'swap'))
+            if slip == 'drop':
+                word = word[:i] + word[i + 1:]
+            elif slip == 'double':
+                word = word[:i] + word[i] + word[i:]
+            else:
+                word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        words.append(word)
+    return ' '.join(words)
+
+def render_prescription(rng, lines, font_path=None, font_size=34):
+    """Render lines as a noisy, slightly rotated scan"""
+    if font_path:
+        font = ImageFont.truetype(font_path, font_size)
+    else:
+        font = ImageFont.load_default(size=font_size)
+    line_height = int(font_size * 1.9)
+    width, height = 1400, 160 + line_height * len(lines)
+    paper = tuple(rng.randint(236, 255) for _ in range(3))
+    image = Image.new('RGB', (width, height), paper)
+    draw = ImageDraw.Draw(image)
+    
+    # Word-level jitter in baseline, spacing and ink darkness
+    for row, line in enumerate(lines):
+        x = 60 + rng.randint(-10, 10)
+        y = 80 + row * line_height
+        for word in line.split(' '):
+            ink = (rng.randint(10, 60), rng.randint(10, 60), rng.randint(60, 120))
+            draw.text((x, y + rng.randint(-4, 4)), word, font=font, fill=ink)
+            x += draw.textlength(word + ' ', font=font) + rng.randint(-2, 6)
+    
+    image = image.rotate(rng.uniform(-2.5, 2.5), resample=Image.BILINEAR, expand=True, fillcolor=paper)
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 0.9)))
+    noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, 8, (image.height, image.width, 1))
+    pixels = np.clip(np.asarray(image, dtype=np.int16) + noise.astype(np.int16), 0, 255)
+    return Image.fromarray(pixels.astype(np.uint8))
+
+def generate_corpus(count, seed=7, font_path=None, render=True):
+    """Yield prescriptions with 'text', 'typo_text' and (when render) 'image'"""
+    drug_names = load_drug_names()
+    font_path = find_font(font_path)
+    for index in range(count):
+        # Separate streams per prescription: rendering (or not) never changes the text
+        text_rng = random.Random(f"{seed}:{index}:text")
+        prescription = make_prescription(text_rng, drug_names, index)
+        prescription['text'] = '\n'.join(prescription['lines'])
+        prescription['typo_text'] = '\n'.join(add_typos(text_rng, line) for line in prescription['lines'])
+        if render:
+            render_rng = random.Random(f"{seed}:{index}:render")
+            prescription['image'] = render_prescription(render_rng, prescription['lines'], font_path)
+        yield prescription
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--font", help="TrueType font to render with (default: first local font found)")
+    args = parser.parse_args(argv)
+    
+    os.makedirs(args.out_dir, exist_ok=True)
+    with open(os.path.join(args.out_dir, "truth.jsonl"), 'w', encoding='utf-8') as truth:
+        for prescription in generate_corpus(args.count, args.seed, args.font):
+            prescription.pop('image').save(os.path.join(args.out_dir, f"{prescription['id']}.png"))
+            truth.write(json.dumps({'id': prescription['id'], 'medicines': prescription['medicines']}) + "\n")
+    print(f"Wrote {args.count} prescriptions to {args.out_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""End-to-end benchmark on a synthetic prescription corpus.
+
+Measures parse throughput, extraction precision/recall (from clean text,
+text with OCR-style typos, and OCR of rendered scans), QR encode time and
+OCR latency percentiles, and writes the results as JSON.
+
+    python benchmarks/pipeline.py [--count 50] [--seed 7] [--skip-ocr] [--output results.json]
+
+OCR uses the locally installed EasyOCR models; when they cannot be loaded
+the OCR section records the error and the other sections still run.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Measure real OCR work, never a result cached by an earlier run
+os.environ["OCR_CACHE_DIR"] = ""
+
+from corpus import find_font, generate_corpus  # noqa: E402
+from dispenser.ocr import get_ocr_reader_pool, run_prescription_ocr  # noqa: E402
+from dispenser.parsing import parse_medicines_from_text  # noqa: E402
+from dispenser.qr import encode_qr_payload, generate_qr_code  # noqa: E402
+
+SCORED_FIELDS = ('dosage', 'frequency', 'duration')
+
+def percentiles(samples_ms):
+    """p50/p95/p99 (nearest rank), mean and max of a list of millisecond timings"""
+    if not samples_ms:
+        return {}
+    ordered = sorted(samples_ms)
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))]
+    return {
+        'count': len(ordered),
+        'p50_ms': round(rank(0.50), 2), 'p95_ms': round(rank(0.95), 2), 'p99_ms': round(rank(0.99), 2),
+        'mean_ms': round(sum(ordered) / len(ordered), 2), 'max_ms': round(ordered[-1], 2),
+    }
+
+def timed_ms(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def normalize(value):
+    return ''.join(str(value).lower().split())
+
+class ExtractionScore:
+    """Drug-name precision/recall and field accuracy for matched drugs"""
+
+    def __init__(self):
+        self.true_positives = 0
+        self.predicted = 0
+        self.expected = 0
+        self.field_hits = Counter()
+
+    def add(self, truth, predicted):
+        # Placeholder rows carry no confidence; they are not extractions
+        predicted = [med for med in predicted if 'confidence' in med]
+        expected_by_name = {normalize(med['name']): med for med in truth}
+        self.expected += len(truth)
+        self.predicted += len(predicted)
+        for med in predicted:
+            expected = expected_by_name.pop(normalize(med['name']), None)
+            if expected is None:
+                continue
+            self.true_positives += 1
+            for field in SCORED_FIELDS:
+                self.field_hits[field] += normalize(med[field]) == normalize(expected[field])
+
+    def result(self):
+        precision = self.true_positives / self.predicted if self.predicted else 0.0
+        recall = self.true_positives / self.expected if self.expected else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        matched = self.true_positives or 1
+        return {
+            'precision': round(precision, 4), 'recall': round(recall, 4), 'f1': round(f1, 4),
+            'expected': self.expected, 'predicted': self.predicted, 'matched': self.true_positives,
+            'field_accuracy': {field: round(self.field_hits[field] / matched, 4) for field in SCORED_FIELDS},
+        }
+
+def bench_parsing(corpus, rounds):
+    scores = {'text': ExtractionScore(), 'text_typos': ExtractionScore()}
+    for prescription in corpus:
+        scores['text'].add(prescription['medicines'], parse_medicines_from_text(prescription['text']))
+        scores['text_typos'].add(prescription['medicines'], parse_medicines_from_text(prescription['typo_text']))
+    
+    texts = [prescription['text'] for prescription in corpus]
+    line_count = sum(len(prescription['lines']) for prescription in corpus)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            parse_medicines_from_text(text)
+    elapsed = time.perf_counter() - start
+    return {
+        'throughput': {
+            'prescriptions_per_s': round(rounds * len(texts) / elapsed, 1),
+            'lines_per_s': round(rounds * line_count / elapsed, 1),
+            'rounds': rounds,
+        },
+        'extraction': {name: score.result() for name, score in scores.items()},
+    }
+
+def bench_qr(corpus):
+    payload_ms, qr_ms, png_ms, sizes = [], [], [], []
+    for i, prescription in enumerate(corpus):
+        record = {'id': f"20261018120000-{i:06x}", 'code': f"{i:08d}", 'date': "2026-10-18 12:00",
+                  'patient': "Benchmark", 'aadhar': "000000000000", 'medicines': prescription['medicines']}
+        payload, ms = timed_ms(encode_qr_payload, record)
+        payload_ms.append(ms)
+        sizes.append(len(payload))
+        image, ms = timed_ms(generate_qr_code, record)
+        qr_ms.append(ms)
+        start = time.perf_counter()
+        image.save(io.BytesIO(), format='PNG')
+        png_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        'encode_payload': percentiles(payload_ms),
+        'generate_qr_code': percentiles(qr_ms),
+        'png_encode': percentiles(png_ms),
+        'payload_chars_mean': round(sum(sizes) / len(sizes), 1),
+    }
+
+def bench_ocr(corpus):
+    try:
+        _, load_ms = timed_ms(get_ocr_reader_pool)
+    except Exception as e:
+        return {'error': f"OCR reader unavailable: {e}"}
+    latencies = []
+    score = ExtractionScore()
+    for prescription in corpus:
+        medicines, ms = timed_ms(run_prescription_ocr, prescription['image'])
+        latencies.append(ms)
+        score.add(prescription['medicines'], medicines)
+    return {'reader_load_ms': round(load_ms, 1), 'latency': percentiles(latencies), 'extraction': score.result()}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=50, help="prescriptions in the corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--font", help="TrueType font for rendering (default: first local font found)")
+    parser.add_argument("--parse-rounds", type=int, default=20, help="passes over the corpus for parse throughput")
+    parser.add_argument("--skip-ocr", action="store_true", help="skip rendering and OCR")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    
+    corpus_start = time.perf_counter()
+    corpus = list(generate_corpus(args.count, args.seed, args.font, render=not args.skip_ocr))
+    corpus_ms = (time.perf_counter() - corpus_start) * 1000
+    
+    parsing = bench_parsing(corpus, args.parse_rounds)
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'corpus_size': len(corpus),
+            'font': find_font(args.font),
+            'corpus_build_ms': round(corpus_ms, 1),
+        },
+        'parse': parsing['throughput'],
+        'extraction': parsing['extraction'],
+        'qr': bench_qr(corpus),
+    }
+    if not args.skip_ocr:
+        results['ocr'] = bench_ocr(corpus)
+        if 'extraction' in results['ocr']:
+            results['extraction']['ocr'] = results['ocr'].pop('extraction')
+    
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
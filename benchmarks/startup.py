@@ -0,0 +1,113 @@
+"""Cold-start benchmark: per-module import time and time to first render.
+
+Every measurement runs in a fresh interpreter so nothing is already imported.
+Import times are cumulative (a module's own dependencies included).
+
+    python benchmarks/startup.py [--repeat 3] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "medicine_app.py")
+
+MODULES = [
+    "streamlit", "numpy", "PIL.Image", "pandas", "qrcode", "smtplib", "easyocr",
+    "dispenser.users", "dispenser.otp", "dispenser.lexicon", "dispenser.parsing",
+    "dispenser.qr", "dispenser.store", "dispenser.ocr", "dispenser.batch", "dispenser.service",
+]
+# Loaded on first use only; the first render must not import any of these
+DEFERRED_MODULES = ["easyocr", "torch", "pandas", "qrcode", "smtplib", "pypdfium2"]
+
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+RENDER_SNIPPET = """
+import json, sys, threading, time
+
+# Note which thread first imports each deferred module
+deferred = set(json.loads(sys.argv[2]))
+imported_by = {}
+class ImportRecorder:
+    def find_spec(self, name, path=None, target=None):
+        if name in deferred and name not in imported_by:
+            imported_by[name] = threading.current_thread().name
+        return None
+sys.meta_path.insert(0, ImportRecorder())
+
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+harness_loaded = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+done = time.perf_counter()
+print(json.dumps({
+    'harness_s': harness_loaded - start,
+    'first_render_s': done - harness_loaded,
+    'exception': [str(e.value) for e in at.exception],
+    'imported_by': imported_by,
+}))
+"""
+
+CORE_SNIPPET = """
+import sys
+import dispenser.batch, dispenser.service
+print('streamlit' in sys.modules)
+"""
+
+def run_python(snippet, *args):
+    result = subprocess.run([sys.executable, "-c", snippet, *args], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+def import_times(repeat):
+    times = {}
+    for module in MODULES:
+        samples = [float(run_python(IMPORT_SNIPPET, module)) for _ in range(repeat)]
+        times[module] = round(statistics.median(samples) * 1000, 1)
+    return times
+
+def first_render(repeat):
+    runs = [json.loads(run_python(RENDER_SNIPPET, APP_PATH, json.dumps(DEFERRED_MODULES)))
+            for _ in range(repeat)]
+    return {
+        'first_render_ms': round(statistics.median(run['first_render_s'] for run in runs) * 1000, 1),
+        'test_harness_ms': round(statistics.median(run['harness_s'] for run in runs) * 1000, 1),
+        'exceptions': runs[-1]['exception'],
+        # Deferred modules should only be imported by the background OCR warmup
+        'deferred_imports_on_render_path': sorted(
+            name for name, thread in runs[-1]['imported_by'].items() if thread != 'ocr-warmup'),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (median is reported)")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    
+    results = {
+        'python': sys.version.split()[0],
+        'repeat': args.repeat,
+        'import_ms': import_times(args.repeat),
+        # The core package must stay importable without Streamlit
+        'core_imports_streamlit': run_python(CORE_SNIPPET) == 'True',
+        **first_render(args.repeat),
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""Prescription OCR, storage and dispensing for the Medicine Dispenser app"""
+import os
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
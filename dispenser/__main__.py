@@ -0,0 +1,46 @@
+"""Command-line tasks, run without Streamlit, e.g.
+
+    python -m dispenser import-users patients.csv
+    python -m dispenser import-prescriptions scans/ --aadhar 123456789012
+"""
+import argparse
+import sys
+
+from .batch import import_prescriptions
+from .metrics import start_exporters
+from .ocr import OCR_DEFAULT_LANGUAGE, OCR_LANGUAGE_NAMES, OCR_READER_POOL_SIZE
+from .users import get_user_directory
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m dispenser")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    users = commands.add_parser("import-users", help="load patients from a CSV with aadhar,name,email columns")
+    users.add_argument("csv_path")
+    
+    prescriptions = commands.add_parser(
+        "import-prescriptions", help="OCR a folder or zip of prescription scans into the store")
+    prescriptions.add_argument("path", help="directory or .zip of JPG/PNG/PDF files")
+    prescriptions.add_argument("--aadhar", help="patient for files not named <aadhar>_...")
+    prescriptions.add_argument("--checkpoint", help="resume file (default <path>.checkpoint.jsonl)")
+    prescriptions.add_argument("--workers", type=int, default=OCR_READER_POOL_SIZE,
+                               help=f"files OCRed at once (at most OCR_READER_POOL_SIZE, {OCR_READER_POOL_SIZE})")
+    prescriptions.add_argument("--language", choices=sorted(OCR_LANGUAGE_NAMES), default=OCR_DEFAULT_LANGUAGE,
+                               help="language printed on the scans besides English")
+    
+    args = parser.parse_args(argv)
+    if args.command == "import-users":
+        imported, skipped = get_user_directory().import_csv(args.csv_path)
+        print(f"Imported {imported} users ({skipped} rows skipped)")
+        return 0
+    start_exporters()
+    try:
+        imported, failed, skipped = import_prescriptions(
+            args.path, args.aadhar, args.checkpoint, args.workers, language=args.language)
+    except ValueError as e:
+        print(e)
+        return 2
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
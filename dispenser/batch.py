@@ -0,0 +1,140 @@
+"""Batch import of scanned prescriptions from a folder or zip"""
+import functools
+import io
+import json
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .metrics import metrics
+from .ocr import OCR_DEFAULT_LANGUAGE, OCR_READER_POOL_SIZE
+from .service import create_prescription, extract_medicines, extract_medicines_from_pdf
+from .uploads import decode_for_ocr
+from .users import get_user_directory
+
+# Batch import: OCR a folder or zip of scanned prescriptions into the store.
+# Files are read lazily and only a few are in flight at once, so memory stays
+# bounded however large the backlog is. Each finished file is appended to a
+# JSONL checkpoint; rerunning with the same checkpoint skips files already
+# imported (failed files are retried).
+BATCH_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.pdf')
+BATCH_AADHAR_PATTERN = re.compile(r'^(\d{12})(?!\d)')  # e.g. 123456789012_visit3.jpg
+BATCH_REPORT_EVERY = 25
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def iter_batch_sources(path):
+    """Yield (name, read_bytes) for every prescription file in a directory or zip, in name order"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                if not info.is_dir() and info.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                    yield info.filename, lambda info=info: archive.read(info)
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                full_path = os.path.join(root, filename)
+                name = os.path.relpath(full_path, path)
+                yield name, functools.partial(_read_file, full_path)
+
+def load_batch_checkpoint(path):
+    """Names already imported according to the checkpoint file"""
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by an interruption
+                if entry.get('id'):
+                    done.add(entry['source'])
+    return done
+
+def batch_patient_for(name, default_aadhar):
+    """Aadhar for a file: a registered 12-digit prefix on its file name, else the default"""
+    match = BATCH_AADHAR_PATTERN.match(os.path.basename(name))
+    if match:
+        return match.group(1) if get_user_directory().get(match.group(1)) else None
+    return default_aadhar
+
+def ocr_batch_item(name, data, language=OCR_DEFAULT_LANGUAGE):
+    """Decode and OCR one file into a list of Medicine"""
+    if name.lower().endswith('.pdf'):
+        medicines = extract_medicines_from_pdf(data, language=language)
+    else:
+        with metrics.span('batch.decode'):
+            image = decode_for_ocr(io.BytesIO(data))
+        medicines = extract_medicines(image, language=language)
+    if not any(med.recognised for med in medicines):
+        raise ValueError("no medicines recognised")
+    return medicines
+
+def import_prescriptions(path, default_aadhar=None, checkpoint_path=None,
+                         workers=OCR_READER_POOL_SIZE, report=print, language=OCR_DEFAULT_LANGUAGE):
+    """OCR every prescription under `path` into the store; returns (imported, failed, skipped)"""
+    # Workers beyond the reader pool would only queue on checkout (and time out there)
+    workers = max(1, min(workers, OCR_READER_POOL_SIZE))
+    if default_aadhar and get_user_directory().get(default_aadhar) is None:
+        raise ValueError(f"Unknown Aadhar number: {default_aadhar}")
+    checkpoint_path = checkpoint_path or f"{path.rstrip(os.sep)}.checkpoint.jsonl"
+    done = load_batch_checkpoint(checkpoint_path)
+    
+    imported = failed = skipped = 0
+    started = time.perf_counter()
+    in_flight = {}
+    
+    def record(future, checkpoint):
+        nonlocal imported, failed
+        name, aadhar = in_flight.pop(future)
+        try:
+            prescription = create_prescription(aadhar, future.result())
+            entry = {'source': name, 'id': prescription.id, 'code': prescription.code}
+            imported += 1
+            metrics.incr('batch.imported')
+        except Exception as e:
+            entry = {'source': name, 'error': str(e)}
+            failed += 1
+            metrics.incr('batch.failed')
+            report(f"  {name}: {e}")
+        checkpoint.write(json.dumps(entry) + "\n")
+        checkpoint.flush()
+        finished = imported + failed
+        if finished % BATCH_REPORT_EVERY == 0:
+            rate = finished / (time.perf_counter() - started)
+            report(f"{finished} processed ({imported} imported, {failed} failed), {rate:.2f} images/sec")
+    
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-ocr") as executor:
+        for name, read in iter_batch_sources(path):
+            if name in done:
+                skipped += 1
+                continue
+            aadhar = batch_patient_for(name, default_aadhar)
+            if aadhar is None:
+                failed += 1
+                report(f"  {name}: no patient (name the file <aadhar>_... or pass --aadhar)")
+                continue
+            # Keep at most two files per worker read into memory
+            while len(in_flight) >= 2 * workers:
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    record(future, checkpoint)
+            in_flight[executor.submit(ocr_batch_item, name, read(), language)] = (name, aadhar)
+        while in_flight:
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                record(future, checkpoint)
+    
+    elapsed = time.perf_counter() - started
+    processed = imported + failed
+    rate = processed / elapsed if elapsed else 0.0
+    report(f"Done: {imported} imported, {failed} failed, {skipped} already imported "
+           f"in {elapsed:.1f}s ({rate:.2f} images/sec)")
+    return imported, failed, skipped
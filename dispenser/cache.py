@@ -0,0 +1,87 @@
+"""Process-wide shared resources and a thread-safe bounded LRU cache"""
+import functools
+import threading
+from collections import OrderedDict
+
+def shared_resource(func=None, *, max_entries=None):
+    """Build a resource once per process (per argument tuple) and share it.
+
+    Plays the role of st.cache_resource without Streamlit: every session,
+    worker thread and CLI run in the process gets the same object, and
+    concurrent first calls build it only once.
+    """
+    if func is None:
+        return lambda func: shared_resource(func, max_entries=max_entries)
+    values = OrderedDict()
+    lock = threading.Lock()
+    
+    @functools.wraps(func)
+    def wrapper(*args):
+        with lock:
+            if args in values:
+                values.move_to_end(args)
+                return values[args]
+            value = func(*args)
+            values[args] = value
+            if max_entries is not None and len(values) > max_entries:
+                values.popitem(last=False)
+            return value
+    
+    wrapper.clear = values.clear
+    return wrapper
+
+# Thread-safe bounded LRU cache shared across sessions via shared_resource
+# (bounded by entry count, or by total size when given max_bytes and a sizeof function)
+class LRUCache:
+    def __init__(self, max_entries, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value (marking it recently used) or None"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries
+
+        The value just stored is never evicted, even when it alone is over
+        max_bytes, so a put is always followed by a successful get.
+        """
+        with self._lock:
+            if self.sizeof is not None:
+                if key in self._data:
+                    self.size_bytes -= self.sizeof(self._data[key])
+                self.size_bytes += self.sizeof(value)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > 1 and (
+                    (self.max_entries is not None and len(self._data) > self.max_entries)
+                    or (self.max_bytes is not None and self.size_bytes > self.max_bytes)):
+                _, evicted = self._data.popitem(last=False)
+                if self.sizeof is not None:
+                    self.size_bytes -= self.sizeof(evicted)
+
+    def keys(self):
+        """Keys from least to most recently used"""
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,216 @@
+"""Medicine lexicon with exact (Aho-Corasick) and fuzzy drug-name matching"""
+import bisect
+import csv
+import json
+import os
+
+from . import APP_DIR
+from .cache import shared_resource
+
+# Medicine lexicon: drug names, aliases and generic mappings from a local CSV/JSON file
+MEDICINE_LEXICON_PATH = os.environ.get(
+    "MEDICINE_LEXICON_PATH",
+    os.path.join(APP_DIR, "data", "medicines.csv")
+)
+
+# Fuzzy drug-name lookup for OCR near-misses ("paracetmol", "amoxicilin")
+FUZZY_MAX_DISTANCE = 2
+FUZZY_PREFIX_LENGTH = 7       # deletes are generated on this prefix only (SymSpell)
+FUZZY_MIN_TOKEN_LENGTH = 5    # shorter tokens are too ambiguous to correct
+FUZZY_MIN_CONFIDENCE = 0.8
+TRAILING_PUNCTUATION = ',.;:)'  # may follow a whole-word lexicon match ("Dolo,")
+
+def _edit_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class FuzzyTermIndex:
+    """SymSpell-style deletion index: lookups touch a handful of buckets, not the whole lexicon"""
+
+    def __init__(self, terms, max_distance=FUZZY_MAX_DISTANCE, prefix_length=FUZZY_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._terms = []
+        self._deletes = {}
+        seen = {}
+        for term, entry in terms:
+            if term in seen:
+                continue
+            seen[term] = len(self._terms)
+            self._terms.append((term, entry))
+            for variant in self._delete_variants(term[:prefix_length]):
+                self._deletes.setdefault(variant, []).append(seen[term])
+
+    def _delete_variants(self, word):
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - variants
+            variants |= frontier
+        return variants
+
+    def lookup(self, token, max_distance=None, limit=5):
+        """Ranked candidates as dicts with entry, term, distance and confidence"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        token = token.lower()
+        candidate_ids = set()
+        for variant in self._delete_variants(token[:self.prefix_length]):
+            candidate_ids.update(self._deletes.get(variant, ()))
+        
+        candidates = []
+        for term_id in candidate_ids:
+            term, entry = self._terms[term_id]
+            distance = _edit_distance(token, term, max_distance)
+            if distance <= max_distance:
+                candidates.append({
+                    'entry': entry,
+                    'term': term,
+                    'distance': distance,
+                    'confidence': round(1 - distance / max(len(token), len(term)), 3)
+                })
+        candidates.sort(key=lambda c: (c['distance'], -c['confidence'], c['term']))
+        return candidates[:limit]
+
+class MedicineLexicon:
+    """Aho-Corasick automaton over every drug name and alias (lowercased)"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        terms = []
+        for entry_id, entry in enumerate(entries):
+            for term in [entry['name']] + entry['aliases']:
+                term = ' '.join(term.lower().split())
+                self._add(term, entry_id)
+                terms.append((term, entry))
+        self._build_failure_links()
+        self.fuzzy = FuzzyTermIndex(terms)
+        self._by_id = {entry['id']: entry for entry in entries}
+        self._by_name = {entry['name'].lower(): entry for entry in entries}
+
+    def entry_for_id(self, entry_id):
+        return self._by_id.get(entry_id)
+
+    def entry_for_name(self, name):
+        return self._by_name.get(' '.join(name.lower().split()))
+
+    @classmethod
+    def from_file(cls, path):
+        """Load entries from CSV (id,name,generic,aliases with '|' separators) or JSON
+
+        The optional `id` is the stable number QR payloads use for the drug; rows
+        without one are numbered by position.
+        """
+        entries = []
+        with open(path, encoding='utf-8', newline='') as f:
+            if path.lower().endswith('.json'):
+                rows = json.load(f)
+            else:
+                rows = csv.DictReader(f)
+            for row in rows:
+                name = (row.get('name') or '').strip()
+                if not name:
+                    continue
+                aliases = row.get('aliases') or []
+                if isinstance(aliases, str):
+                    aliases = aliases.split('|')
+                entries.append({
+                    'id': int(row['id']) if row.get('id') not in (None, '') else len(entries) + 1,
+                    'name': name,
+                    'generic': (row.get('generic') or '').strip() or name,
+                    'aliases': [a.strip() for a in aliases if a.strip()]
+                })
+        return cls(entries)
+
+    def _add(self, term, entry_id):
+        if not term:
+            return
+        node = 0
+        for ch in term:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(term), entry_id))
+
+    def _build_failure_links(self):
+        # Breadth-first so every failure target is finished before it is used
+        pending = list(self._goto[0].values())
+        for node in pending:
+            for ch, nxt in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+                pending.append(nxt)
+
+    def find(self, text):
+        """Yield (start, end, entry) for every term occurrence in one pass over text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, entry_id in out[node]:
+                yield i + 1 - length, i + 1, self.entries[entry_id]
+
+    def match_words(self, words):
+        """Return (first_word, last_word + 1, entry) spans, longest match first, non-overlapping
+
+        Only whole words match (trailing punctuation aside): a term inside a
+        longer word ("dolo" in "Dolores") is left to the fuzzy lookup, which
+        scores it below 1.0.
+        """
+        starts = []
+        offset = 0
+        for word in words:
+            starts.append(offset)
+            offset += len(word) + 1
+        
+        matches = sorted(self.find(' '.join(words)), key=lambda m: (m[0], m[0] - m[1]))
+        spans = []
+        covered_until = -1
+        for start, end, entry in matches:
+            first = bisect.bisect_right(starts, start) - 1
+            if first <= covered_until:
+                continue
+            last = bisect.bisect_right(starts, end - 1) - 1
+            if start != starts[first] or words[last][end - starts[last]:].strip(TRAILING_PUNCTUATION):
+                continue
+            spans.append((first, last + 1, entry))
+            covered_until = last
+        return spans
+
+# Compiled once per file version and shared across sessions; editing the
+# file changes its mtime, which reloads the lexicon without a restart
+@shared_resource(max_entries=2)
+def _compile_medicine_lexicon(path, mtime):
+    return MedicineLexicon.from_file(path)
+
+def load_medicine_lexicon(path=MEDICINE_LEXICON_PATH):
+    return _compile_medicine_lexicon(path, os.path.getmtime(path))
@@ -0,0 +1,188 @@
+"""In-process instrumentation: timing spans, counters and memory high-water marks
+
+Recording is a couple of dict/deque operations under a lock plus one
+getrusage call, cheap enough to leave on around every hot-path stage.
+Optional exporters write span events to a JSONL file and serve a
+Prometheus-style text endpoint on localhost.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+METRICS_WINDOW = int(os.environ.get("METRICS_WINDOW", 1024))  # recent samples kept per stage
+METRICS_JSONL_PATH = os.environ.get("METRICS_JSONL_PATH", "")
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))         # 0 disables the /metrics endpoint
+METRICS_FLUSH_INTERVAL = 5.0                                  # seconds between JSONL writes
+METRICS_MAX_PENDING_EVENTS = 100000                           # oldest events are dropped past this
+
+def peak_rss_bytes():
+    """Process peak resident set size so far (0 where the platform does not report it)"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB elsewhere
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class Metrics:
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._samples = {}      # stage -> recent durations (ms)
+        self._totals = {}       # stage -> [count, total ms]
+        self._counters = {}
+        self._peak_rss = 0
+        self._peak_by_stage = {}  # stage -> peak RSS when that stage last raised it
+        self._events = None     # pending span events, only while JSONL export runs
+
+    @contextmanager
+    def span(self, stage, timings=None):
+        """Time the block as `stage`; also store the ms in `timings` under the stage's last part"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.record(stage, ms)
+            if timings is not None:
+                timings[stage.rsplit('.', 1)[-1]] = round(ms, 1)
+
+    def record(self, stage, ms):
+        rss = peak_rss_bytes()
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = [0, 0.0]
+            samples.append(ms)
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += ms
+            if rss > self._peak_rss:
+                self._peak_rss = rss
+                self._peak_by_stage[stage] = rss
+            if self._events is not None:
+                self._events.append({'ts': round(time.time(), 3), 'stage': stage, 'ms': round(ms, 3)})
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Per-stage p50/p95/p99 over the recent window, lifetime totals, counters and memory"""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+            totals = {stage: tuple(values) for stage, values in self._totals.items()}
+            counters = dict(self._counters)
+            peak_by_stage = dict(self._peak_by_stage)
+        stages = {}
+        for stage, ordered in sorted(samples.items()):
+            count, total_ms = totals[stage]
+            stages[stage] = {
+                'count': count,
+                'total_ms': round(total_ms, 1),
+                'p50_ms': round(_percentile(ordered, 0.50), 2),
+                'p95_ms': round(_percentile(ordered, 0.95), 2),
+                'p99_ms': round(_percentile(ordered, 0.99), 2),
+                'max_ms': round(ordered[-1], 2),
+            }
+        return {
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'stages': stages,
+            'counters': dict(sorted(counters.items())),
+            'memory': {
+                'peak_rss_bytes': max(peak_rss_bytes(), self._peak_rss),
+                'peak_raised_by': dict(sorted(peak_by_stage.items(), key=lambda item: -item[1])),
+            },
+        }
+
+    def prometheus_text(self):
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = ["# TYPE dispenser_stage_seconds summary"]
+        for stage, stats in snapshot['stages'].items():
+            for quantile, key in (("0.5", 'p50_ms'), ("0.95", 'p95_ms'), ("0.99", 'p99_ms')):
+                lines.append(f'dispenser_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[key] / 1000:.6f}')
+            lines.append(f'dispenser_stage_seconds_sum{{stage="{stage}"}} {stats["total_ms"] / 1000:.6f}')
+            lines.append(f'dispenser_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines.append("# TYPE dispenser_events_total counter")
+        for name, value in snapshot['counters'].items():
+            lines.append(f'dispenser_events_total{{name="{name}"}} {value}')
+        lines.append("# TYPE dispenser_peak_rss_bytes gauge")
+        lines.append(f"dispenser_peak_rss_bytes {snapshot['memory']['peak_rss_bytes']}")
+        return "\n".join(lines) + "\n"
+
+    def drain_events(self):
+        with self._lock:
+            if not self._events:
+                return []
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    def enable_events(self):
+        with self._lock:
+            if self._events is None:
+                self._events = deque(maxlen=METRICS_MAX_PENDING_EVENTS)
+
+# One collector per process, shared by every session and worker thread
+metrics = Metrics()
+
+def _flush_jsonl(path):
+    events = metrics.drain_events()
+    if events:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(event) + "\n" for event in events)
+
+def _write_jsonl(path, interval):
+    while True:
+        time.sleep(interval)
+        _flush_jsonl(path)
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the app log
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+def start_exporters(jsonl_path=METRICS_JSONL_PATH, port=METRICS_PORT):
+    """Start the configured exporters once per process"""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if jsonl_path:
+        metrics.enable_events()
+        atexit.register(_flush_jsonl, jsonl_path)
+        threading.Thread(target=_write_jsonl, args=(jsonl_path, METRICS_FLUSH_INTERVAL),
+                         name="metrics-jsonl", daemon=True).start()
+    if port:
+        server = ThreadingHTTPServer((METRICS_HOST, port), _PrometheusHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
@@ -0,0 +1,84 @@
+"""Typed records for medicines and prescriptions
+
+The storage, QR and OCR modules exchange plain dicts (they are what gets
+serialized); these dataclasses are the typed form used by the service API.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+# Explicit __slots__ (dataclass(slots=True) needs Python 3.10); slotted
+# fields cannot have class-level defaults, so each class writes its own
+# __init__ and the dataclass supplies __repr__ and __eq__.
+
+@dataclass(init=False)
+class Medicine:
+    __slots__ = ('name', 'dosage', 'frequency', 'duration', 'confidence')
+
+    name: str
+    dosage: str
+    frequency: str
+    duration: str
+    # Per-field OCR confidence (0-1); None for medicines that were typed in
+    confidence: dict[str, float] | None
+
+    def __init__(self, name, dosage='', frequency='', duration='', confidence=None):
+        self.name = name
+        self.dosage = dosage
+        self.frequency = frequency
+        self.duration = duration
+        self.confidence = confidence
+
+    @classmethod
+    def from_dict(cls, data):
+        confidence = data.get('confidence')
+        return cls(data.get('name', ''), data.get('dosage', ''), data.get('frequency', ''),
+                   data.get('duration', ''), dict(confidence) if confidence is not None else None)
+
+    def to_dict(self, with_confidence=True):
+        data = {'name': self.name, 'dosage': self.dosage, 'frequency': self.frequency, 'duration': self.duration}
+        if with_confidence and self.confidence is not None:
+            data['confidence'] = dict(self.confidence)
+        return data
+
+    @property
+    def recognised(self):
+        """False for the placeholder rows OCR returns when it found no drug"""
+        return self.confidence is not None
+
+@dataclass(init=False)
+class Prescription:
+    __slots__ = ('id', 'code', 'patient', 'aadhar', 'date', 'medicines', 'dispensed_at')
+
+    id: str
+    code: str
+    patient: str
+    aadhar: str
+    date: str
+    medicines: list[Medicine]
+    dispensed_at: float | None
+
+    def __init__(self, id, code, patient, aadhar, date, medicines=None, dispensed_at=None):
+        self.id = id
+        self.code = code
+        self.patient = patient
+        self.aadhar = aadhar
+        self.date = date
+        self.medicines = medicines if medicines is not None else []
+        self.dispensed_at = dispensed_at
+
+    @classmethod
+    def from_dict(cls, data, dispensed_at=None):
+        return cls(data['id'], data['code'], data['patient'], data['aadhar'], data['date'],
+                   [Medicine.from_dict(med) for med in data['medicines']], dispensed_at)
+
+    def to_dict(self):
+        """The stored record (no OCR confidences, no dispense state)"""
+        return {
+            'id': self.id,
+            'patient': self.patient,
+            'aadhar': self.aadhar,
+            'date': self.date,
+            'medicines': [med.to_dict(with_confidence=False) for med in self.medicines],
+            'code': self.code,
+        }
@@ -0,0 +1,642 @@
+"""OCR pipeline: reader pool, preprocessing, result cache, PDFs and background jobs
+
+EasyOCR (and with it torch) is imported on first use, not at import time.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .cache import LRUCache, shared_resource
+from .metrics import metrics
+from .parsing import mock_ocr_fallback, parse_medicines_from_ocr
+
+logger = logging.getLogger(__name__)
+
+# OCR languages: each non-English model also reads English, so a request
+# needs exactly one recognition model (plus the shared text detector).
+# Weights are only read from OCR_MODEL_DIR; nothing is downloaded at runtime.
+OCR_LANGUAGE_MODELS = {
+    'en': 'english_g2.pth',
+    'hi': 'devanagari.pth',
+    'ta': 'tamil.pth',
+    'te': 'telugu.pth',
+}
+OCR_LANGUAGE_NAMES = {
+    'en': "English",
+    'hi': "Hindi + English",
+    'ta': "Tamil + English",
+    'te': "Telugu + English",
+}
+OCR_DETECTOR_MODEL = 'craft_mlt_25k.pth'
+OCR_MODEL_DIR = os.path.expanduser(os.environ.get("OCR_MODEL_DIR") or os.path.join(
+    os.environ.get("EASYOCR_MODULE_PATH", "~/.EasyOCR"), "model"))
+OCR_DEFAULT_LANGUAGE = os.environ.get("OCR_DEFAULT_LANGUAGE", "en")
+
+def ocr_language_list(language):
+    """EasyOCR language list for a language code"""
+    if language not in OCR_LANGUAGE_MODELS:
+        raise ValueError(f"Unsupported OCR language: {language}")
+    return ['en'] if language == 'en' else [language, 'en']
+
+def installed_ocr_languages(model_dir=OCR_MODEL_DIR):
+    """Languages whose weights are present locally"""
+    if not os.path.isfile(os.path.join(model_dir, OCR_DETECTOR_MODEL)):
+        return []
+    return [language for language, filename in OCR_LANGUAGE_MODELS.items()
+            if os.path.isfile(os.path.join(model_dir, filename))]
+
+# Create an EasyOCR reader (one per reader pool slot)
+def load_ocr_reader(language=OCR_DEFAULT_LANGUAGE):
+    import easyocr  # pulls in torch; deferred so pages that never OCR stay fast to load
+    return easyocr.Reader(ocr_language_list(language), gpu=False,
+                          model_storage_directory=OCR_MODEL_DIR, download_enabled=False)
+
+def reader_size_bytes(reader):
+    """Approximate weight memory of a reader's detector and recognizer"""
+    size = 0
+    for name in ('detector', 'recognizer'):
+        module = getattr(reader, name, None)
+        if hasattr(module, 'parameters'):
+            size += sum(t.numel() * t.element_size() for t in module.parameters())
+            size += sum(t.numel() * t.element_size() for t in module.buffers())
+    return size
+
+# Pool of preloaded OCR readers per language; size bounds how many readtext
+# calls run at once for that language
+OCR_READER_POOL_SIZE = int(os.environ.get(
+    "OCR_READER_POOL_SIZE", max(1, min(4, (os.cpu_count() or 1) // 2))
+))
+OCR_TORCH_THREADS = int(os.environ.get(
+    "OCR_TORCH_THREADS", max(1, (os.cpu_count() or 1) // OCR_READER_POOL_SIZE)
+))
+OCR_CHECKOUT_TIMEOUT = 120  # seconds to wait for a free reader
+OCR_READER_MEMORY_BUDGET = int(os.environ.get("OCR_READER_MEMORY_BUDGET", 1024 * 1024 * 1024))
+
+class OCRReaderPool:
+    def __init__(self, size, torch_threads, language=OCR_DEFAULT_LANGUAGE):
+        self.size = size
+        self.torch_threads = torch_threads
+        self.language = language
+        self._readers = queue.Queue()
+        for _ in range(size):
+            self._readers.put(load_ocr_reader(language))
+        self.size_bytes = size * reader_size_bytes(self._readers.queue[0])
+
+    @contextmanager
+    def checkout(self, timeout=OCR_CHECKOUT_TIMEOUT):
+        """Borrow a reader, blocking up to `timeout` seconds for one to free up"""
+        try:
+            with metrics.span('ocr.reader_wait'):
+                reader = self._readers.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No OCR reader became available within {timeout}s")
+        try:
+            # Split the cores between pool slots instead of oversubscribing them
+            import torch
+            torch.set_num_threads(self.torch_threads)
+            yield reader
+        finally:
+            self._readers.put(reader)
+
+    def available(self):
+        return self._readers.qsize()
+
+class OCRReaderPools:
+    """One reader pool per language, least recently used evicted past a memory budget
+
+    A pool evicted while a request holds one of its readers stays alive
+    until that request finishes; the next request for the language reloads it.
+    """
+
+    def __init__(self, memory_budget, size, torch_threads):
+        self.size = size
+        self.torch_threads = torch_threads
+        self.pools = LRUCache(max_entries=None, max_bytes=memory_budget,
+                              sizeof=lambda pool: pool.size_bytes)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, language):
+        ocr_language_list(language)  # reject unknown codes before loading anything
+        pool = self.pools.get(language)
+        if pool is not None:
+            return pool
+        # Load each language once even when several requests want it at the same time
+        with self._lock:
+            load_lock = self._load_locks.setdefault(language, threading.Lock())
+        with load_lock:
+            pool = self.pools.get(language)
+            if pool is None:
+                with metrics.span(f'ocr.reader_load.{language}'):
+                    pool = OCRReaderPool(self.size, self.torch_threads, language)
+                if self.pools.max_bytes is not None and pool.size_bytes > self.pools.max_bytes:
+                    logger.warning(
+                        "OCR reader pool for %r needs %d MB, over OCR_READER_MEMORY_BUDGET (%d MB); "
+                        "keeping it loaded on its own", language,
+                        pool.size_bytes // 2**20, self.pools.max_bytes // 2**20)
+                self.pools.put(language, pool)
+                metrics.incr('ocr.reader_pools.loaded')
+        return pool
+
+    def loaded_languages(self):
+        return self.pools.keys()
+
+@shared_resource
+def get_ocr_reader_pools():
+    return OCRReaderPools(OCR_READER_MEMORY_BUDGET, OCR_READER_POOL_SIZE, OCR_TORCH_THREADS)
+
+def get_ocr_reader_pool(language=OCR_DEFAULT_LANGUAGE):
+    return get_ocr_reader_pools().get(language)
+
+# Load the default language's reader pool in a background thread, started
+# once the first page has been drawn, so no user request pays the cold-start
+# model load
+@shared_resource
+def start_ocr_warmup():
+    thread = threading.Thread(target=get_ocr_reader_pool, name="ocr-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# Image preprocessing before OCR (each step can be switched off)
+OCR_PREPROCESS_CONFIG = {
+    'exif_rotate': True,
+    'grayscale': True,
+    'max_long_edge': 1600,    # pixels; None keeps the original resolution
+    'autocontrast': True,
+    'contrast_cutoff': 1,     # percent of darkest/lightest pixels clipped
+    'deskew': True,
+    'deskew_max_angle': 10,   # degrees searched either side of horizontal
+    'deskew_step': 0.5,
+    'crop_paper': True,
+    'crop_min_area': 0.3      # never crop away more than 70% of the image
+}
+
+def _remove_alpha(image):
+    # Transparent areas become white paper instead of black ink
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+    return background
+
+def _estimate_skew(gray, max_angle, step):
+    """Find the rotation that makes text rows most horizontal (projection profile)"""
+    small = gray.copy()
+    small.thumbnail((400, 400))
+    pixels = np.asarray(small)
+    ink = Image.fromarray(np.where(pixels < pixels.mean() * 0.8, 255, 0).astype(np.uint8))
+    
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rotated = np.asarray(ink.rotate(float(angle), resample=Image.NEAREST))
+        score = float(np.var(rotated.sum(axis=1, dtype=np.int64)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def _paper_bbox(gray, min_area):
+    """Bounding box of the bright paper region, or None if it is not clear-cut"""
+    small = gray.copy()
+    small.thumbnail((400, 400))
+    scale = gray.width / small.width
+    bright = np.asarray(small) > np.asarray(small).mean()
+    
+    rows = np.flatnonzero(bright.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(bright.mean(axis=0) > 0.5)
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+    
+    left, top = int(cols[0] * scale), int(rows[0] * scale)
+    right = min(gray.width, int((cols[-1] + 1) * scale))
+    bottom = min(gray.height, int((rows[-1] + 1) * scale))
+    area = (right - left) * (bottom - top) / (gray.width * gray.height)
+    if area < min_area or area > 0.98:
+        return None
+    return left, top, right, bottom
+
+def preprocess_for_ocr(image, config=OCR_PREPROCESS_CONFIG):
+    """Prepare an uploaded image for OCR; returns (array, per-step timings in ms)"""
+    timings = {}
+    
+    def timed(step, func, img):
+        start = time.perf_counter()
+        result = func(img)
+        ms = (time.perf_counter() - start) * 1000
+        timings[step] = round(ms, 1)
+        metrics.record(f"ocr.preprocess.{step}", ms)
+        return result
+    
+    # Only transpose when the EXIF orientation asks for it (exif_transpose always copies)
+    if config.get('exif_rotate') and image.getexif().get(0x0112, 1) != 1:
+        image = timed('exif_rotate', ImageOps.exif_transpose, image)
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = timed('remove_alpha', _remove_alpha, image)
+    if config.get('grayscale') and image.mode != 'L':  # convert() copies even to the same mode
+        image = timed('grayscale', lambda img: img.convert('L'), image)
+    
+    max_long_edge = config.get('max_long_edge')
+    if max_long_edge and max(image.size) > max_long_edge:
+        def downscale(img):
+            scale = max_long_edge / max(img.size)
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+        image = timed('downscale', downscale, image)
+    
+    if config.get('autocontrast'):
+        image = timed('autocontrast', lambda img: ImageOps.autocontrast(img, cutoff=config.get('contrast_cutoff', 0)), image)
+    
+    # Deskew and crop need a single-channel view of the page
+    if config.get('deskew') or config.get('crop_paper'):
+        gray = image if image.mode == 'L' else image.convert('L')
+        
+        if config.get('deskew'):
+            def deskew(img):
+                angle = _estimate_skew(gray, config['deskew_max_angle'], config['deskew_step'])
+                if abs(angle) < config['deskew_step']:
+                    return img
+                fill = 255 if img.mode == 'L' else (255, 255, 255)
+                return img.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=fill)
+            image = timed('deskew', deskew, image)
+            gray = image if image.mode == 'L' else image.convert('L')
+        
+        if config.get('crop_paper'):
+            def crop(img):
+                bbox = _paper_bbox(gray, config['crop_min_area'])
+                return img.crop(bbox) if bbox else img
+            image = timed('crop_paper', crop, image)
+    
+    img_array = timed('to_array', np.asarray, image)
+    return img_array, timings
+
+# OCR result cache: repeat submissions of the same scan skip EasyOCR.
+# Keyed by a hash of the decoded pixels (plus EXIF orientation and the
+# preprocessing config), so re-encodes of identical pixels hit too. A
+# perceptual hash is deliberately not used: two scans differing in one
+# dosage digit must never share a result. Entries hold only the raw
+# readtext output, as JSON in a memory LRU optionally backed by a directory
+# on disk (both tiers evict by total size); medicines are parsed again on
+# every hit, so lexicon and parser changes apply to repeat scans too.
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR", "")  # empty disables the disk tier
+OCR_CACHE_DISK_MAX_BYTES = int(os.environ.get("OCR_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+OCR_CACHE_HASH_ROWS = 256  # pixel rows hashed per chunk, instead of one full-size tobytes() copy
+
+def ocr_cache_key(image, language=OCR_DEFAULT_LANGUAGE, config=OCR_PREPROCESS_CONFIG):
+    digest = hashlib.sha256()
+    header = [image.mode, image.size, image.getexif().get(0x0112, 1), language, sorted(config.items())]
+    digest.update(json.dumps(header).encode('utf-8'))
+    for top in range(0, image.height, OCR_CACHE_HASH_ROWS):
+        band = image.crop((0, top, image.width, min(image.height, top + OCR_CACHE_HASH_ROWS)))
+        digest.update(band.tobytes())
+    return digest.hexdigest()
+
+class DiskCache:
+    """Directory of <key>.json files, evicting least recently used files past max_bytes"""
+
+    def __init__(self, directory, max_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size_bytes = sum(entry.stat().st_size for entry in os.scandir(directory)
+                               if entry.name.endswith('.json'))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            os.utime(path)  # mtime doubles as the recency used for eviction
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(value)
+        with self._lock:
+            if os.path.exists(path):
+                self._size_bytes -= os.path.getsize(path)
+            os.replace(temp_path, path)
+            self._size_bytes += len(value)
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._size_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._size_bytes -= size
+
+class OCRResultCache:
+    """Memory tier in front of an optional disk tier; values are JSON bytes"""
+
+    def __init__(self, max_bytes, directory=None, disk_max_bytes=0):
+        self.memory = LRUCache(max_entries=None, max_bytes=max_bytes, sizeof=len)
+        self.disk = DiskCache(directory, disk_max_bytes) if directory else None
+
+    def get(self, key):
+        """readtext results for a cached image, or None"""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        if value is None:
+            return None
+        return json.loads(value)['results']
+
+    def put(self, key, results):
+        value = json.dumps({'results': results},
+                           default=lambda o: o.item()).encode('utf-8')  # numpy scalars in boxes
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self):
+        stats = {'memory_hits': self.memory.hits, 'memory_misses': self.memory.misses,
+                 'memory_entries': len(self.memory), 'memory_bytes': self.memory.size_bytes}
+        if self.disk is not None:
+            stats.update(disk_hits=self.disk.hits, disk_misses=self.disk.misses)
+        return stats
+
+@shared_resource
+def get_ocr_result_cache():
+    return OCRResultCache(OCR_CACHE_MAX_BYTES, OCR_CACHE_DIR or None, OCR_CACHE_DISK_MAX_BYTES)
+
+# OCR + medicine extraction without any UI calls (safe to run in worker threads)
+def run_prescription_ocr(image, progress=None, timings=None, language=OCR_DEFAULT_LANGUAGE):
+    """Extract text from prescription image and parse medicines, raising on failure"""
+    report = progress or (lambda fraction, message: None)
+    
+    # Same pixels as an earlier scan: reuse its OCR text
+    cache = get_ocr_result_cache()
+    with metrics.span('ocr.cache_lookup', timings):
+        cache_key = ocr_cache_key(image, language)
+        results = cache.get(cache_key)
+    if results is not None:
+        metrics.incr('ocr.cache.hits')
+        if timings is not None:
+            timings['cache_hits'] = 1
+    else:
+        metrics.incr('ocr.cache.misses')
+        
+        # Preprocess and convert PIL image to numpy array
+        report(0.05, "Preparing image")
+        with metrics.span('ocr.preprocess'):
+            img_array, preprocess_timings = preprocess_for_ocr(image)
+        if timings is not None:
+            timings.update(preprocess_timings)
+        
+        # Borrow a preloaded reader for the language and perform OCR
+        report(0.1, "Waiting for an OCR reader")
+        with get_ocr_reader_pool(language).checkout() as reader:
+            report(0.3, "Reading prescription text")
+            with metrics.span('ocr.readtext', timings):
+                results = reader.readtext(img_array)
+        cache.put(cache_key, results)
+    
+    # Parse medicines from the boxes, text and confidences
+    report(0.9, "Parsing medicines")
+    with metrics.span('ocr.parse', timings):
+        return parse_medicines_from_ocr(results)
+
+# Multi-page PDF prescriptions: pages are rasterized one at a time, blank
+# pages are skipped from a tiny preview render, and the rest are OCRed
+# concurrently before their medicine lists are merged
+PDF_RENDER_DPI = 200
+PDF_BLANK_CHECK_DPI = 24
+PDF_INK_CONTRAST = 48        # how much darker than the paper a pixel must be to count as ink
+PDF_BLANK_INK_RATIO = 0.0002 # pages with less ink than this are skipped as blank
+PDF_MAX_PAGES_IN_FLIGHT = OCR_READER_POOL_SIZE
+
+def is_blank_page(gray):
+    """True if a grayscale page render has (almost) no ink on it"""
+    paper = np.median(gray)
+    ink = np.count_nonzero(gray < paper - PDF_INK_CONTRAST)
+    return ink < PDF_BLANK_INK_RATIO * gray.size
+
+def iter_pdf_pages(pdf_source, dpi=PDF_RENDER_DPI):
+    """Yield (page_number, page_count, image or None if blank), one page in memory at a time"""
+    import pypdfium2 as pdfium  # optional dependency, only needed for PDF uploads
+    
+    pdf = pdfium.PdfDocument(pdf_source)
+    try:
+        page_count = len(pdf)
+        for index in range(page_count):
+            page = pdf[index]
+            try:
+                with metrics.span('pdf.blank_check'):
+                    preview = page.render(scale=PDF_BLANK_CHECK_DPI / 72, grayscale=True)
+                    blank = is_blank_page(np.asarray(preview.to_pil()))
+                    preview.close()
+                if blank:
+                    metrics.incr('pdf.blank_pages')
+                    yield index + 1, page_count, None
+                    continue
+                with metrics.span('pdf.render'):
+                    bitmap = page.render(scale=dpi / 72, grayscale=True)
+                    # Copy out of pdfium's buffer so the bitmap can be freed right away
+                    image = bitmap.to_pil().copy()
+                    bitmap.close()
+                metrics.incr('pdf.pages')
+            finally:
+                page.close()
+            yield index + 1, page_count, image
+    finally:
+        pdf.close()
+
+def merge_medicine_lists(medicine_lists):
+    """Merge per-page medicine lists, de-duplicating by name and keeping the most confident fields"""
+    merged = {}
+    for medicines in medicine_lists:
+        # Placeholder entries (no OCR confidence) only matter if nothing was found
+        for med in medicines:
+            if 'confidence' not in med:
+                continue
+            key = ' '.join(med['name'].lower().split())
+            if key not in merged:
+                merged[key] = dict(med, confidence=dict(med['confidence']))
+                continue
+            kept = merged[key]
+            for field in ('dosage', 'frequency', 'duration'):
+                if med['confidence'].get(field, 0) > kept['confidence'].get(field, 0):
+                    kept[field] = med[field]
+                    kept['confidence'][field] = med['confidence'][field]
+    if merged:
+        return list(merged.values())
+    return next((medicines for medicines in medicine_lists if medicines), mock_ocr_fallback())
+
+# One page executor for every PDF job, so concurrent PDFs queue their pages
+# here instead of all waiting (and timing out) on reader checkout
+@shared_resource
+def get_pdf_page_executor():
+    return ThreadPoolExecutor(max_workers=PDF_MAX_PAGES_IN_FLIGHT, thread_name_prefix="ocr-page")
+
+def run_pdf_prescription_ocr(pdf_source, progress=None, timings=None, language=OCR_DEFAULT_LANGUAGE):
+    """OCR every non-blank page of a PDF prescription and merge the medicines
+
+    A page that fails is counted and skipped; the job only fails when every
+    non-blank page does.
+    """
+    report = progress or (lambda fraction, message: None)
+    executor = get_pdf_page_executor()
+    futures = []
+    blank_pages = 0
+    
+    for page_number, page_count, image in iter_pdf_pages(pdf_source):
+        report(0.8 * (page_number - 1) / page_count, f"Reading page {page_number} of {page_count}")
+        if image is None:
+            blank_pages += 1
+            continue
+        page_timings = {}
+        futures.append((executor.submit(run_prescription_ocr, image, None, page_timings, language), page_timings))
+        # Bound how many rasterized pages this job keeps alive at once
+        pending = [future for future, _ in futures if not future.done()]
+        if len(pending) >= PDF_MAX_PAGES_IN_FLIGHT:
+            wait(pending, return_when=FIRST_COMPLETED)
+    
+    report(0.8, "Finishing remaining pages")
+    medicine_lists = []
+    errors = []
+    for future, _ in futures:
+        try:
+            medicine_lists.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        metrics.incr('pdf.failed_pages', len(errors))
+        if not medicine_lists:
+            raise errors[0]
+    
+    if timings is not None:
+        for _, page_timings in futures:
+            for step, ms in page_timings.items():
+                timings[step] = round(timings.get(step, 0) + ms, 1)
+        timings['pages'] = len(futures)
+        timings['blank_pages'] = blank_pages
+        timings['failed_pages'] = len(errors)
+    
+    report(0.95, "Merging medicines")
+    return merge_medicine_lists(medicine_lists)
+
+# Background OCR jobs: bounded worker pool with submit/poll by job ID
+OCR_MAX_WORKERS = OCR_READER_POOL_SIZE  # one job worker per pooled reader
+OCR_MAX_RETAINED_JOBS = 256
+OCR_POLL_INTERVAL = 1.0  # seconds between upload page reruns while a job runs
+OCR_TIMING_COUNTS = ('pages', 'blank_pages', 'failed_pages', 'cache_hits')  # counts, not ms, in job timings
+
+class OCRJobQueue:
+    def __init__(self, max_workers, max_retained=OCR_MAX_RETAINED_JOBS):
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, image, language=OCR_DEFAULT_LANGUAGE):
+        """Queue an OCR job for the image and return its job ID"""
+        return self._submit(functools.partial(run_prescription_ocr, language=language), image)
+
+    def submit_pdf(self, pdf_source, language=OCR_DEFAULT_LANGUAGE):
+        """Queue an OCR job for every page of a PDF and return its job ID"""
+        return self._submit(functools.partial(run_pdf_prescription_ocr, language=language), pdf_source)
+
+    def _submit(self, task, source):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                'status': 'queued',
+                'progress': 0.0,
+                'message': "Waiting for a free OCR worker",
+                'result': None,
+                'error': None,
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'timings': {},
+                'future': None
+            }
+            self._prune()
+        future = self._executor.submit(self._run, job_id, task, source)
+        self._update(job_id, future=future)
+        metrics.incr('ocr.jobs.submitted')
+        return job_id
+
+    def poll(self, job_id):
+        """Return a snapshot of the job's status, progress and result (None if unknown)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+        snapshot.pop('future')
+        return snapshot
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet and forget it"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job and job['future'] is not None and job['future'].cancel():
+            metrics.incr('ocr.jobs.cancelled')
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _run(self, job_id, task, source):
+        timings = {}
+        with self._lock:
+            submitted_at = self._jobs[job_id]['submitted_at'] if job_id in self._jobs else time.time()
+        metrics.record('ocr.job_queue_wait', (time.time() - submitted_at) * 1000)
+        self._update(job_id, status='running', message="Starting OCR", timings=timings)
+        try:
+            with metrics.span('ocr.job'):
+                medicines = task(
+                    source,
+                    lambda fraction, message: self._update(job_id, progress=fraction, message=message),
+                    timings
+                )
+        except Exception as e:
+            metrics.incr('ocr.jobs.failed')
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+        else:
+            metrics.incr('ocr.jobs.done')
+            self._update(job_id, status='done', progress=1.0, message="Done",
+                         result=medicines, finished_at=time.time())
+
+    def _prune(self):
+        # Drop the oldest finished jobs once the table is over its bound
+        excess = len(self._jobs) - self.max_retained
+        for job_id in [j for j, job in self._jobs.items() if job['finished_at']][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+@shared_resource
+def get_ocr_job_queue():
+    return OCRJobQueue(OCR_MAX_WORKERS)
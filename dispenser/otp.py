@@ -0,0 +1,308 @@
+"""OTP generation, server-side OTP store and background email delivery"""
+import hashlib
+import heapq
+import hmac
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .cache import shared_resource
+
+# OTP delivery: background sender threads that reuse authenticated SMTP
+# connections. Point OTP_SMTP_HOST/PORT at a local stand-in (e.g.
+# `python -m aiosmtpd -n -l localhost:8025` with OTP_SMTP_SSL=0) for testing.
+OTP_SMTP_HOST = os.environ.get("OTP_SMTP_HOST", "smtp.gmail.com")
+OTP_SMTP_PORT = int(os.environ.get("OTP_SMTP_PORT", 465))
+OTP_SMTP_SSL = os.environ.get("OTP_SMTP_SSL", "1") != "0"
+# Server-wide sender used when a session has not saved its own Gmail config
+OTP_SMTP_SENDER = os.environ.get("OTP_SMTP_SENDER")
+OTP_SMTP_USERNAME = os.environ.get("OTP_SMTP_USERNAME")
+OTP_SMTP_PASSWORD = os.environ.get("OTP_SMTP_PASSWORD")
+OTP_SENDER_THREADS = 2
+OTP_SEND_ATTEMPTS = 3
+OTP_BACKOFF_BASE = 0.5  # seconds, doubled after every failed attempt
+OTP_MAX_TRACKED_DELIVERIES = 1000
+
+class SMTPTransport:
+    """A reusable SMTP connection that reconnects with backoff when the server drops it"""
+
+    def __init__(self, host, port, use_ssl, username=None, password=None):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self._server = None
+
+    def _connect(self):
+        import smtplib
+        
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=30)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.username:
+            server.login(self.username, self.password)
+        self._server = server
+
+    def send(self, message):
+        import smtplib
+        
+        for attempt in range(OTP_SEND_ATTEMPTS):
+            try:
+                if self._server is None:
+                    self._connect()
+                self._server.send_message(message)
+                return attempt + 1
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError):
+                self.close()
+                if attempt == OTP_SEND_ATTEMPTS - 1:
+                    raise
+                time.sleep(OTP_BACKOFF_BASE * 2 ** attempt)
+
+    @staticmethod
+    def keeps_connection_after(error):
+        """True for errors about one message; smtplib resets the session and the connection stays usable"""
+        import smtplib
+        
+        return isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError))
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+def smtp_transport_factory(credentials):
+    username, password = credentials
+    return SMTPTransport(OTP_SMTP_HOST, OTP_SMTP_PORT, OTP_SMTP_SSL, username, password)
+
+class OTPMailer:
+    """Queue of outgoing OTP emails with per-delivery status the UI can poll"""
+
+    def __init__(self, transport_factory, workers=OTP_SENDER_THREADS):
+        self._transport_factory = transport_factory
+        self._queue = queue.Queue()
+        self._deliveries = OrderedDict()
+        self._lock = threading.Lock()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"otp-sender-{i}", daemon=True).start()
+
+    def submit(self, credentials, message):
+        """Queue a message for delivery and return its delivery ID"""
+        delivery_id = uuid.uuid4().hex
+        with self._lock:
+            self._deliveries[delivery_id] = {'status': 'queued', 'error': None, 'attempts': 0,
+                                             'queued_at': time.time(), 'sent_at': None}
+            while len(self._deliveries) > OTP_MAX_TRACKED_DELIVERIES:
+                self._deliveries.popitem(last=False)
+        self._queue.put((delivery_id, credentials, message))
+        return delivery_id
+
+    def status(self, delivery_id):
+        with self._lock:
+            delivery = self._deliveries.get(delivery_id)
+            return dict(delivery) if delivery else None
+
+    def _update(self, delivery_id, **fields):
+        with self._lock:
+            if delivery_id in self._deliveries:
+                self._deliveries[delivery_id].update(fields)
+
+    def _worker(self):
+        # Each worker keeps its own connection per sender account (smtplib
+        # connections are not thread-safe)
+        transports = {}
+        while True:
+            delivery_id, credentials, message = self._queue.get()
+            self._update(delivery_id, status='sending')
+            try:
+                if credentials not in transports:
+                    transports[credentials] = self._transport_factory(credentials)
+                attempts = transports[credentials].send(message)
+            except Exception as e:
+                # Drop (and close) the connection unless only this message was refused
+                transport = transports.get(credentials)
+                if transport is not None and not transport.keeps_connection_after(e):
+                    transports.pop(credentials).close()
+                self._update(delivery_id, status='failed', error=str(e))
+            else:
+                self._update(delivery_id, status='sent', attempts=attempts, sent_at=time.time())
+
+@shared_resource
+def get_otp_mailer():
+    return OTPMailer(smtp_transport_factory)
+
+def build_otp_message(sender_email, to_email, otp, user_name):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    
+    # Create message
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = to_email
+    msg['Subject'] = '🔐 Medicine Dispenser - Your OTP Code'
+    
+    # Email body
+    body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; padding: 20px;">
+        <div style="background: linear-gradient(90deg, #e3f2fd 0%, #bbdefb 100%); padding: 20px; border-radius: 10px;">
+            <h2 style="color: #1e88e5;">💊 Medicine Dispenser</h2>
+            <p>Hello <strong>{user_name}</strong>,</p>
+            <p>Your One-Time Password (OTP) for login is:</p>
+            <div style="background: #fff3e0; padding: 15px; border-radius: 5px; text-align: center; margin: 20px 0;">
+                <h1 style="color: #1e88e5; font-size: 32px; letter-spacing: 5px;">{otp}</h1>
+            </div>
+            <p>This OTP is valid for 5 minutes.</p>
+            <p style="color: #666; font-size: 12px;">If you didn't request this OTP, please ignore this email.</p>
+        </div>
+    </body>
+    </html>
+    """
+    
+    msg.attach(MIMEText(body, 'html'))
+    return msg
+
+def generate_otp():
+    """Generate a 6-digit OTP"""
+    return f"{secrets.randbelow(900000) + 100000}"
+
+# Server-side OTP store: TTL expiry from a heap (no scans), token-bucket rate
+# limits per Aadhar and per client IP, and a cap on verification attempts
+OTP_STORE_BACKEND = os.environ.get("OTP_STORE_BACKEND", "memory")
+OTP_TTL_SECONDS = 300
+OTP_MAX_ATTEMPTS = 5
+OTP_AADHAR_RATE = (3, 600)   # at most 3 OTPs per Aadhar per 10 minutes
+OTP_IP_RATE = (10, 600)      # at most 10 OTPs per client IP per 10 minutes
+DEMO_OTP = '123456'
+
+class OTPRateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many OTP requests. Try again in {int(retry_after) + 1} seconds.")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    def __init__(self, capacity, period, now):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full_at(self):
+        return self.updated + (self.capacity - self.tokens) / self.rate
+
+class InMemoryOTPStore:
+    def __init__(self, ttl=OTP_TTL_SECONDS, max_attempts=OTP_MAX_ATTEMPTS,
+                 aadhar_rate=OTP_AADHAR_RATE, ip_rate=OTP_IP_RATE, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.rates = {'aadhar': aadhar_rate, 'ip': ip_rate}
+        self._clock = clock
+        self._otps = {}      # aadhar -> {'digest', 'expires_at', 'attempts', 'demo'}
+        self._buckets = {}   # (kind, key) -> TokenBucket
+        self._expiry = []    # heap of (when, kind, key) deadlines
+        self._lock = threading.Lock()
+
+    def _digest(self, otp):
+        return hashlib.sha256(otp.encode('utf-8')).digest()
+
+    def _evict_expired(self, now):
+        # Pop only deadlines that have passed; entries renewed since their
+        # deadline was pushed are skipped, not removed
+        while self._expiry and self._expiry[0][0] <= now:
+            _, kind, key = heapq.heappop(self._expiry)
+            if kind == 'otp':
+                entry = self._otps.get(key)
+                if entry is not None and entry['expires_at'] <= now:
+                    del self._otps[key]
+            else:
+                bucket = self._buckets.get((kind, key))
+                if bucket is not None and bucket.full_at() <= now:
+                    del self._buckets[(kind, key)]
+
+    def _bucket(self, kind, key, now):
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            capacity, period = self.rates[kind]
+            bucket = self._buckets[(kind, key)] = TokenBucket(capacity, period, now)
+        return bucket
+
+    def issue(self, aadhar, client_ip=None, demo=False):
+        """Create a new OTP for the Aadhar; raises OTPRateLimited when a limit is hit
+
+        `demo` marks an OTP that is not delivered anywhere, for which DEMO_OTP
+        is accepted as well.
+        """
+        with self._lock:
+            now = self._clock()
+            self._evict_expired(now)
+            buckets = [self._bucket('aadhar', aadhar, now)]
+            if client_ip:
+                buckets.append(self._bucket('ip', client_ip, now))
+            retry_after = max(bucket.wait_time(now) for bucket in buckets)
+            if retry_after > 0:
+                raise OTPRateLimited(retry_after)
+            
+            for bucket, key in zip(buckets, [('aadhar', aadhar), ('ip', client_ip)]):
+                bucket.take(now)
+                heapq.heappush(self._expiry, (bucket.full_at(), key[0], key[1]))
+            
+            otp = generate_otp()
+            self._otps[aadhar] = {'digest': self._digest(otp), 'expires_at': now + self.ttl,
+                                  'attempts': 0, 'demo': demo}
+            heapq.heappush(self._expiry, (now + self.ttl, 'otp', aadhar))
+            return otp
+
+    def verify(self, aadhar, otp):
+        """Check an OTP: 'ok', 'invalid', 'expired' (or never issued) or 'locked'"""
+        with self._lock:
+            now = self._clock()
+            self._evict_expired(now)
+            entry = self._otps.get(aadhar)
+            if entry is None or entry['expires_at'] <= now:
+                return 'expired'
+            if entry['attempts'] >= self.max_attempts:
+                return 'locked'
+            digest = self._digest(otp)
+            if hmac.compare_digest(entry['digest'], digest) or (
+                    entry['demo'] and hmac.compare_digest(self._digest(DEMO_OTP), digest)):
+                del self._otps[aadhar]
+                return 'ok'
+            entry['attempts'] += 1
+            return 'locked' if entry['attempts'] >= self.max_attempts else 'invalid'
+
+    def discard(self, aadhar):
+        with self._lock:
+            self._otps.pop(aadhar, None)
+
+    def __len__(self):
+        return len(self._otps)
+
+# OTP store backends by name; shared stores implement issue/verify/discard
+OTP_STORE_BACKENDS = {
+    'memory': InMemoryOTPStore
+}
+
+@shared_resource
+def get_otp_store():
+    return OTP_STORE_BACKENDS[OTP_STORE_BACKEND]()
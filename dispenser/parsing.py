@@ -0,0 +1,164 @@
+"""Turn OCR output or plain text into medicine records"""
+import bisect
+import re
+
+from .lexicon import (
+    FUZZY_MIN_CONFIDENCE, FUZZY_MIN_TOKEN_LENGTH, TRAILING_PUNCTUATION, load_medicine_lexicon,
+)
+
+# Prescription token patterns, compiled once; alternatives are tried in order
+# so "500 mg" is a dosage before it can be a plain word
+PRESCRIPTION_TOKEN_PATTERN = re.compile(r"""
+    (?P<dosage>\b\d+(?:\.\d+)?\s*(?:mg|mcg|ml|g|iu|units?)\b)
+  | (?P<duration>\b\d+\s*(?:days?|weeks?|wks?|months?)\b)
+  | (?P<frequency>\b(?:once|twice|thrice|\d+\s*times?)(?:\s+(?:a|per|daily|day|weekly|week))*\b
+      | \b[0-2]\s*-\s*[0-2]\s*-\s*[0-2]\b
+      | \b(?:od|bd|bid|tds|tid|qid|hs|sos|daily)\b)
+  | (?P<route>\b(?:tab(?:let)?s?|cap(?:sule)?s?|syr(?:up)?|inj(?:ection)?|oral|drops?|cream|ointment)\b)
+  | (?P<word>\S+)
+""", re.VERBOSE)
+NON_LETTERS = re.compile(r'[^a-z]')
+MEDICINE_FIELDS = ('name', 'dosage', 'frequency', 'duration')
+OCR_LOW_CONFIDENCE = 0.5  # fields below this are highlighted on the edit page
+
+def group_ocr_rows(results):
+    """Rebuild text rows from readtext (bbox, text, conf) triples using box geometry"""
+    boxes = []
+    for bbox, text, conf in results:
+        ys = [point[1] for point in bbox]
+        boxes.append((sum(ys) / len(ys), max(ys) - min(ys), min(point[0] for point in bbox), text, conf))
+    if not boxes:
+        return []
+    
+    # Boxes whose vertical centres are within half a line height share a row
+    heights = sorted(box[1] for box in boxes)
+    tolerance = max(heights[len(heights) // 2], 1) / 2
+    rows = []
+    row_total = 0.0
+    for center, _, left, text, conf in sorted(boxes, key=lambda box: box[0]):
+        if not rows or center - row_total / len(rows[-1]) > tolerance:
+            rows.append([])
+            row_total = 0.0
+        rows[-1].append((left, text, conf))
+        row_total += center
+    return [[(text, conf) for _, text, conf in sorted(row)] for row in rows]
+
+def tokenize_prescription(rows):
+    """Tokenize OCR rows in one pass; each row is a list of (text, confidence) segments.
+
+    Returns a list of rows of (tag, value, confidence) tokens.
+    """
+    lexicon = load_medicine_lexicon()
+    tagged_rows = []
+    
+    for segments in rows:
+        line = ' '.join(text.lower() for text, _ in segments)
+        segment_starts = []
+        offset = 0
+        for text, _ in segments:
+            segment_starts.append(offset)
+            offset += len(text) + 1
+        
+        tokens = []
+        for match in PRESCRIPTION_TOKEN_PATTERN.finditer(line):
+            first = bisect.bisect_right(segment_starts, match.start()) - 1
+            last = bisect.bisect_right(segment_starts, match.end() - 1) - 1
+            confidence = min(conf for _, conf in segments[first:last + 1])
+            tokens.append((match.lastgroup, ' '.join(match.group().split()), confidence))
+        word_positions = [i for i, token in enumerate(tokens) if token[0] == 'word']
+        words = [tokens[i][1] for i in word_positions]
+        
+        # Drug names: exact lexicon matches (may span several words), then
+        # fuzzy corrections for the words nothing matched
+        drugs = {}
+        for start, end, entry in lexicon.match_words(words):
+            span = [tokens[p][2] for p in word_positions[start:end]]
+            name = ' '.join(words[start:end]).rstrip(TRAILING_PUNCTUATION)
+            drugs[word_positions[start]] = (word_positions[end - 1], name, min(span))
+        covered = {i for start, (end, _, _) in drugs.items() for i in range(start, end + 1)}
+        for position, word in zip(word_positions, words):
+            token = NON_LETTERS.sub('', word)
+            if position in covered or len(token) < FUZZY_MIN_TOKEN_LENGTH:
+                continue
+            candidates = lexicon.fuzzy.lookup(token, max_distance=1 if len(token) < 8 else 2, limit=1)
+            if candidates and candidates[0]['confidence'] >= FUZZY_MIN_CONFIDENCE:
+                confidence = tokens[position][2] * candidates[0]['confidence']
+                drugs[position] = (position, candidates[0]['term'], confidence)
+        
+        tagged = []
+        skip_until = -1
+        for i, token in enumerate(tokens):
+            if i <= skip_until:
+                continue
+            if i in drugs:
+                skip_until, name, confidence = drugs[i]
+                tagged.append(('drug', name, confidence))
+            else:
+                tagged.append(token)
+        tagged_rows.append(tagged)
+    
+    return tagged_rows
+
+def _medicines_from_rows(rows):
+    medicines = []
+    dosages = []
+    
+    # Attribute each dosage/frequency/duration to the closest preceding drug on
+    # its row; rows without a drug continue the previous medicine
+    current = None
+    for tagged in tokenize_prescription(rows):
+        for tag, value, confidence in tagged:
+            if tag == 'drug':
+                current = {'name': value.title(), 'dosage': '', 'frequency': '', 'duration': '',
+                           'confidence': {'name': round(confidence, 2)}}
+                medicines.append(current)
+            elif tag in ('dosage', 'frequency', 'duration'):
+                if tag == 'dosage':
+                    dosages.append(value)
+                if current is not None and not current[tag]:
+                    current[tag] = value
+                    current['confidence'][tag] = round(confidence, 2)
+    
+    # Defaults for anything the prescription did not state (flagged for review)
+    defaults = {'dosage': '500mg', 'frequency': '2 times daily', 'duration': '5 days'}
+    for med in medicines:
+        for field, default in defaults.items():
+            if not med[field]:
+                med[field] = default
+                med['confidence'][field] = 0.0
+    
+    # If no medicines found, fall back to any numbers followed by 'mg', 'ml', etc.
+    if not medicines:
+        for i, dose in enumerate(dosages[:3]):  # Limit to 3 medicines
+            medicines.append({
+                'name': f'Medicine {i+1}',
+                'dosage': dose,
+                'frequency': '2 times daily',
+                'duration': '5 days'
+            })
+    
+    # If still no medicines, return at least one blank entry
+    if not medicines:
+        medicines.append({
+            'name': 'Medicine 1',
+            'dosage': '',
+            'frequency': '',
+            'duration': ''
+        })
+    
+    return medicines
+
+def parse_medicines_from_text(text):
+    """Parse medicine information from extracted text (one OCR segment per line)"""
+    return _medicines_from_rows([[(line, 1.0)] for line in text.splitlines()])
+
+def parse_medicines_from_ocr(results):
+    """Parse medicines from readtext (bbox, text, conf) triples, keeping per-field confidence"""
+    return _medicines_from_rows(group_ocr_rows(results))
+
+def mock_ocr_fallback():
+    """Fallback mock data if OCR fails"""
+    return [
+        {"name": "Medicine 1", "dosage": "", "frequency": "", "duration": ""},
+        {"name": "Medicine 2", "dosage": "", "frequency": "", "duration": ""}
+    ]
@@ -0,0 +1,181 @@
+"""Compact, versioned QR payloads and QR image generation"""
+import hashlib
+import hmac
+import io
+import json
+import os
+import secrets
+import zlib
+
+from PIL import Image
+
+from . import APP_DIR
+from .cache import LRUCache, shared_resource
+from .lexicon import load_medicine_lexicon
+from .metrics import metrics
+
+QR_CACHE_MAX_ENTRIES = 512
+
+@shared_resource
+def get_qr_cache():
+    return LRUCache(QR_CACHE_MAX_ENTRIES)
+
+# Canonical JSON so equal prescriptions always produce the same QR payload
+def canonical_payload(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+# Compact, versioned QR payload
+#
+#   "RX:" + base45( version byte | flags byte | body )
+#
+# flags: 0x01 body is raw-deflate compressed, 0x02 signed reference mode.
+# v1 full body: compact JSON [id, code, date, [[drug, dosage, frequency, duration], ...]]
+#   where drug is the lexicon id (int) when the name is a lexicon entry, else the text.
+#   Patient name and Aadhar are not carried; the counter resolves them from the store.
+# v1 reference body: compact JSON [id, code] followed by an 8-byte HMAC-SHA256 tag.
+# Base45 output only uses the QR alphanumeric character set, which QR codes
+# store at 5.5 bits per character instead of 8.
+QR_PAYLOAD_VERSION = 1
+QR_PAYLOAD_PREFIX = "RX:"
+QR_FLAG_COMPRESSED = 0x01
+QR_FLAG_REFERENCE = 0x02
+QR_SIGNATURE_BYTES = 8
+QR_PAYLOAD_MODE = os.environ.get("QR_PAYLOAD_MODE", "full")  # 'full' or 'reference'
+BASE45_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+
+def base45_encode(data):
+    chars = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        chars += [BASE45_CHARSET[c], BASE45_CHARSET[d], BASE45_CHARSET[e]]
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        chars += [BASE45_CHARSET[c], BASE45_CHARSET[d]]
+    return ''.join(chars)
+
+def base45_decode(text):
+    try:
+        values = [BASE45_CHARSET.index(ch) for ch in text]
+    except ValueError:
+        raise ValueError("Invalid base45 character") from None
+    if len(values) % 3 == 1:
+        raise ValueError("Invalid base45 length")
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        chunk = values[i:i + 3]
+        if len(chunk) == 3:
+            n = chunk[0] + chunk[1] * 45 + chunk[2] * 2025
+            if n > 0xFFFF:
+                raise ValueError("Invalid base45 triplet")
+            out += bytes(divmod(n, 256))
+        else:
+            n = chunk[0] + chunk[1] * 45
+            if n > 0xFF:
+                raise ValueError("Invalid base45 pair")
+            out.append(n)
+    return bytes(out)
+
+# Signing key for reference-mode payloads: QR_SIGNING_KEY, or a random key
+# persisted next to the database so codes stay valid across restarts
+@shared_resource
+def get_qr_signing_key():
+    if os.environ.get("QR_SIGNING_KEY"):
+        return os.environ["QR_SIGNING_KEY"].encode('utf-8')
+    path = os.path.join(APP_DIR, "data", "qr_signing.key")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(secrets.token_bytes(32))
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _qr_signature(body):
+    return hmac.new(get_qr_signing_key(), body, hashlib.sha256).digest()[:QR_SIGNATURE_BYTES]
+
+def encode_qr_payload(prescription, mode=None):
+    """Encode a prescription into the compact QR text (full or signed-reference mode)"""
+    mode = mode or QR_PAYLOAD_MODE
+    if mode == 'reference':
+        body = json.dumps([prescription['id'], prescription['code']], separators=(',', ':')).encode('utf-8')
+        return QR_PAYLOAD_PREFIX + base45_encode(
+            bytes([QR_PAYLOAD_VERSION, QR_FLAG_REFERENCE]) + body + _qr_signature(body)
+        )
+    
+    lexicon = load_medicine_lexicon()
+    medicines = []
+    for med in prescription['medicines']:
+        entry = lexicon.entry_for_name(med['name'])
+        medicines.append([entry['id'] if entry else med['name'], med['dosage'], med['frequency'], med['duration']])
+    body = json.dumps(
+        [prescription['id'], prescription['code'], prescription['date'], medicines],
+        separators=(',', ':'), ensure_ascii=False
+    ).encode('utf-8')
+    
+    flags = 0
+    compressed = zlib.compress(body, 9)[2:-4]  # raw deflate: drop zlib header and checksum
+    if len(compressed) < len(body):
+        body, flags = compressed, QR_FLAG_COMPRESSED
+    return QR_PAYLOAD_PREFIX + base45_encode(bytes([QR_PAYLOAD_VERSION, flags]) + body)
+
+def decode_qr_payload(text):
+    """Decode compact QR text; raises ValueError for malformed, unknown or forged payloads"""
+    text = text.strip()
+    if not text.startswith(QR_PAYLOAD_PREFIX):
+        raise ValueError("Not a prescription QR code")
+    raw = base45_decode(text[len(QR_PAYLOAD_PREFIX):])
+    if len(raw) < 2 or raw[0] != QR_PAYLOAD_VERSION:
+        raise ValueError("Unsupported prescription QR version")
+    flags, body = raw[1], raw[2:]
+    
+    if flags & QR_FLAG_REFERENCE:
+        body, signature = body[:-QR_SIGNATURE_BYTES], body[-QR_SIGNATURE_BYTES:]
+        if not hmac.compare_digest(signature, _qr_signature(body)):
+            raise ValueError("Prescription QR signature does not match")
+        prescription_id, code = json.loads(body)
+        return {'mode': 'reference', 'id': prescription_id, 'code': code}
+    
+    if flags & QR_FLAG_COMPRESSED:
+        body = zlib.decompress(body, -15)
+    prescription_id, code, date, medicines = json.loads(body)
+    lexicon = load_medicine_lexicon()
+    decoded = []
+    for drug, dosage, frequency, duration in medicines:
+        entry = lexicon.entry_for_id(drug) if isinstance(drug, int) else None
+        name = entry['name'] if entry else str(drug)
+        decoded.append({'name': name, 'dosage': dosage, 'frequency': frequency, 'duration': duration})
+    return {'mode': 'full', 'id': prescription_id, 'code': code, 'date': date, 'medicines': decoded}
+
+# Generate QR code
+def generate_qr_code(data):
+    import qrcode
+    
+    with metrics.span('qr.encode_payload'):
+        payload = encode_qr_payload(data)
+    with metrics.span('qr.render'):
+        qr = qrcode.QRCode(box_size=10, border=4)
+        qr.add_data(payload)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color="black", back_color="white")
+    # Convert to PIL Image if needed
+    if not isinstance(img, Image.Image):
+        img = img.convert('RGB')
+    return img
+
+def qr_png_bytes(data):
+    """Return PNG-encoded QR bytes, rendering only on a cache miss"""
+    key = hashlib.sha256(f"{QR_PAYLOAD_MODE}:{canonical_payload(data)}".encode('utf-8')).hexdigest()
+    cache = get_qr_cache()
+    png = cache.get(key)
+    if png is not None:
+        metrics.incr('qr.cache.hits')
+        return png
+    metrics.incr('qr.cache.misses')
+    image = generate_qr_code(data)
+    with metrics.span('qr.png_encode'):
+        buf = io.BytesIO()
+        image.save(buf, format='PNG')
+        png = buf.getvalue()
+    cache.put(key, png)
+    return png
@@ -0,0 +1,116 @@
+"""Streamlit-free service API: OCR, parsing, prescriptions and dispensing
+
+Everything here can run in a worker process, a batch job or a benchmark;
+the Streamlit app is one client of it.
+"""
+from __future__ import annotations
+
+from .models import Medicine, Prescription
+from .ocr import (
+    OCR_DEFAULT_LANGUAGE, get_ocr_job_queue, installed_ocr_languages, run_pdf_prescription_ocr,
+    run_prescription_ocr,
+)
+from .parsing import mock_ocr_fallback, parse_medicines_from_text
+from .qr import qr_png_bytes
+from .store import (
+    LookupThrottled, code_from_scan, get_dispensing_index, get_lookup_throttle, get_prescription_store,
+    save_prescription,
+)
+from .users import get_user_directory
+
+def extract_medicines(image, progress=None, timings=None,
+                      language=OCR_DEFAULT_LANGUAGE) -> list[Medicine]:
+    """OCR a prescription image (PIL) into medicines; raises on OCR failure"""
+    return [Medicine.from_dict(med) for med in run_prescription_ocr(image, progress, timings, language)]
+
+def extract_medicines_from_pdf(pdf_source, progress=None, timings=None,
+                               language=OCR_DEFAULT_LANGUAGE) -> list[Medicine]:
+    """OCR every non-blank page of a PDF (bytes or path) into one medicine list"""
+    return [Medicine.from_dict(med)
+            for med in run_pdf_prescription_ocr(pdf_source, progress, timings, language)]
+
+def ocr_languages() -> list[str]:
+    """Languages whose OCR weights are installed (the default language when none are)"""
+    return installed_ocr_languages() or [OCR_DEFAULT_LANGUAGE]
+
+def submit_ocr_job(image, language=OCR_DEFAULT_LANGUAGE) -> str:
+    """Queue OCR of a decoded image (PIL) in the background; returns the job ID to poll"""
+    return get_ocr_job_queue().submit(image, language)
+
+def submit_pdf_ocr_job(pdf_source, language=OCR_DEFAULT_LANGUAGE) -> str:
+    """Queue OCR of every page of a PDF (bytes, path or file object); returns the job ID"""
+    return get_ocr_job_queue().submit_pdf(pdf_source, language)
+
+def poll_ocr_job(job_id) -> dict | None:
+    """Status, progress, message, timings and error of a job; `result` is a list of Medicine once done"""
+    job = get_ocr_job_queue().poll(job_id)
+    if job is not None and job['result'] is not None:
+        job['result'] = [Medicine.from_dict(med) for med in job['result']]
+    return job
+
+def cancel_ocr_job(job_id):
+    """Cancel a job that has not started yet"""
+    get_ocr_job_queue().cancel(job_id)
+
+def placeholder_medicines() -> list[Medicine]:
+    """Blank rows to fill in by hand when OCR fails"""
+    return [Medicine.from_dict(med) for med in mock_ocr_fallback()]
+
+def parse_text(text) -> list[Medicine]:
+    """Parse medicines from prescription text, one line per row"""
+    return [Medicine.from_dict(med) for med in parse_medicines_from_text(text)]
+
+def create_prescription(aadhar, medicines: list[Medicine]) -> Prescription:
+    """Store a prescription for a registered patient, allocating its ID and numeric code"""
+    user = get_user_directory().get(aadhar)
+    if user is None:
+        raise ValueError(f"Unknown Aadhar number: {aadhar}")
+    record = save_prescription({'aadhar': aadhar, 'name': user['name']},
+                               [med.to_dict(with_confidence=False) for med in medicines])
+    return Prescription.from_dict(record)
+
+def count_prescriptions(aadhar) -> int:
+    return get_prescription_store().count_by_patient(aadhar)
+
+def list_prescriptions(aadhar, limit=20, offset=0) -> list[Prescription]:
+    """A patient's prescriptions, newest first"""
+    return [Prescription.from_dict(record)
+            for record in get_prescription_store().list_by_patient(aadhar, limit=limit, offset=offset)]
+
+def prescription_summaries(aadhar) -> list[tuple]:
+    """(id, date, code, medicine count) rows for a patient's whole history, newest first"""
+    return get_prescription_store().summary_by_patient(aadhar)
+
+def prescription_qr_png(prescription: Prescription) -> bytes:
+    """PNG bytes of the prescription's QR code"""
+    return qr_png_bytes(prescription.to_dict())
+
+def find_prescription(code) -> Prescription | None:
+    """The prescription for a numeric code, with its dispense state"""
+    entry = get_dispensing_index().lookup(code)
+    if entry is None:
+        return None
+    return Prescription.from_dict(entry['prescription'], entry['dispensed_at'])
+
+def counter_lookup(scanned, pharmacist) -> Prescription | None:
+    """Resolve a scanned QR payload or typed code at the counter
+
+    Unknown or unreadable codes count against the pharmacist's failed-lookup
+    allowance; raises LookupThrottled once it is used up.
+    """
+    throttle = get_lookup_throttle()
+    retry_after = throttle.retry_after(pharmacist)
+    if retry_after > 0:
+        raise LookupThrottled(retry_after)
+    code = code_from_scan(scanned)
+    prescription = find_prescription(code) if code else None
+    if prescription is None:
+        throttle.record_failure(pharmacist)
+    return prescription
+
+def dispense(code) -> tuple[bool, Prescription | None]:
+    """Dispense a code exactly once; returns (dispensed_now, prescription)"""
+    dispensed_now, entry = get_dispensing_index().dispense(code)
+    if entry is None:
+        return False, None
+    return dispensed_now, Prescription.from_dict(entry['prescription'], entry['dispensed_at'])
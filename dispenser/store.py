@@ -0,0 +1,274 @@
+"""Prescription storage, numeric codes and counter-side dispensing"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+from . import APP_DIR
+from .cache import LRUCache, shared_resource
+from .metrics import metrics
+from .otp import TokenBucket
+from .qr import QR_PAYLOAD_PREFIX, decode_qr_payload
+
+# Generate numeric code (uniqueness is enforced when the prescription is stored)
+def generate_numeric_code():
+    return f"{secrets.randbelow(10 ** 8):08d}"
+
+# Persistent prescription store behind a small repository API
+PRESCRIPTION_STORE_BACKEND = os.environ.get("PRESCRIPTION_STORE_BACKEND", "sqlite")
+PRESCRIPTION_DB_PATH = os.environ.get(
+    "PRESCRIPTION_DB_PATH", os.path.join(APP_DIR, "data", "prescriptions.db")
+)
+
+class DuplicateCodeError(Exception):
+    """Raised when a numeric code is already allocated to another prescription"""
+
+class SQLitePrescriptionStore:
+    """SQLite (WAL) store; one connection per process, shared by every session"""
+
+    def __init__(self, path):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS prescriptions (
+                id TEXT PRIMARY KEY,
+                code TEXT NOT NULL,
+                aadhar TEXT NOT NULL,
+                patient TEXT NOT NULL,
+                date TEXT NOT NULL,
+                medicines TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                dispensed_at REAL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_prescriptions_code_unique ON prescriptions (code);
+            CREATE INDEX IF NOT EXISTS idx_prescriptions_aadhar_created ON prescriptions (aadhar, created_at);
+            CREATE INDEX IF NOT EXISTS idx_prescriptions_date ON prescriptions (date);
+            DROP INDEX IF EXISTS idx_prescriptions_code;
+        """)
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        return {
+            "id": row['id'],
+            "patient": row['patient'],
+            "aadhar": row['aadhar'],
+            "date": row['date'],
+            "medicines": json.loads(row['medicines']),
+            "code": row['code']
+        }
+
+    def add(self, prescription):
+        """Insert a prescription; raises DuplicateCodeError if its numeric code is taken"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO prescriptions (id, code, aadhar, patient, date, medicines, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (prescription['id'], prescription['code'], prescription['aadhar'], prescription['patient'],
+                     prescription['date'], json.dumps(prescription['medicines']), time.time())
+                )
+        except sqlite3.IntegrityError as e:
+            if 'code' in str(e):
+                raise DuplicateCodeError(prescription['code']) from e
+            raise
+
+    def get(self, prescription_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM prescriptions WHERE id = ?", (prescription_id,)).fetchone()
+        return self._to_dict(row)
+
+    def get_by_code(self, code):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM prescriptions WHERE code = ? ORDER BY created_at DESC LIMIT 1", (code,)
+            ).fetchone()
+        return self._to_dict(row)
+
+    def dispensed_at(self, prescription_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dispensed_at FROM prescriptions WHERE id = ?", (prescription_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_dispensed(self, code, when):
+        """Atomically mark a prescription dispensed; False if it already was (or is unknown)"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE prescriptions SET dispensed_at = ? WHERE code = ? AND dispensed_at IS NULL",
+                (when, code)
+            )
+        return cursor.rowcount == 1
+
+    def count_by_patient(self, aadhar):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM prescriptions WHERE aadhar = ?", (aadhar,)
+            ).fetchone()[0]
+
+    def list_by_patient(self, aadhar, limit=20, offset=0):
+        """One page of a patient's prescriptions, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM prescriptions WHERE aadhar = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (aadhar, limit, offset)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def summary_by_patient(self, aadhar):
+        """(id, date, code, medicine count) rows for the patient's whole history, newest first"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, date, code, json_array_length(medicines) FROM prescriptions "
+                "WHERE aadhar = ? ORDER BY created_at DESC",
+                (aadhar,)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# Storage backends by name; alternative stores implement the same methods
+PRESCRIPTION_STORE_BACKENDS = {
+    'sqlite': lambda: SQLitePrescriptionStore(PRESCRIPTION_DB_PATH),
+    'memory': lambda: SQLitePrescriptionStore(':memory:')
+}
+
+@shared_resource
+def get_prescription_store():
+    return PRESCRIPTION_STORE_BACKENDS[PRESCRIPTION_STORE_BACKEND]()
+
+NUMERIC_CODE_ATTEMPTS = 10
+
+# Counter-side index: numeric code -> prescription and dispense state, kept
+# in memory with write-through to the store for dispensing
+DISPENSE_INDEX_MAX_ENTRIES = 100000
+
+class DispensingIndex:
+    def __init__(self, store, max_entries=DISPENSE_INDEX_MAX_ENTRIES):
+        self.store = store
+        self._entries = LRUCache(max_entries)
+        self._lock = threading.Lock()
+
+    def lookup(self, code):
+        """Return {'prescription', 'dispensed_at'} for a numeric code, or None"""
+        entry = self._entries.get(code)
+        if entry is None:
+            prescription = self.store.get_by_code(code)
+            if prescription is None:
+                return None
+            entry = {'prescription': prescription, 'dispensed_at': self.store.dispensed_at(prescription['id'])}
+            self._entries.put(code, entry)
+        return entry
+
+    def dispense(self, code):
+        """Mark a code dispensed exactly once; returns (dispensed_now, entry)"""
+        with self._lock:
+            entry = self.lookup(code)
+            if entry is None or entry['dispensed_at'] is not None:
+                return False, entry
+            when = time.time()
+            # The conditional UPDATE is the source of truth, so two counters
+            # (or two server processes) can never dispense the same code
+            dispensed_now = self.store.mark_dispensed(code, when)
+            entry = dict(entry, dispensed_at=when if dispensed_now else self.store.dispensed_at(entry['prescription']['id']))
+            self._entries.put(code, entry)
+            return dispensed_now, entry
+
+@shared_resource
+def get_dispensing_index():
+    return DispensingIndex(get_prescription_store())
+
+# Failed counter lookups are throttled per pharmacist, so the 10^8 code
+# space cannot be enumerated from a counter session
+LOOKUP_FAILURE_RATE = (10, 600)  # at most 10 unknown codes per pharmacist per 10 minutes
+
+class LookupThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many unknown codes. Try again in {int(retry_after) + 1} seconds.")
+        self.retry_after = retry_after
+
+class LookupThrottle:
+    def __init__(self, rate=LOOKUP_FAILURE_RATE, clock=time.monotonic):
+        self.capacity, self.period = rate
+        self._clock = clock
+        self._buckets = {}  # pharmacist -> TokenBucket of allowed failures
+        self._lock = threading.Lock()
+
+    def retry_after(self, key):
+        """Seconds until `key` may look up codes again (0 while it has failures left)"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            return bucket.wait_time(self._clock()) if bucket else 0.0
+
+    def record_failure(self, key):
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                # Refilled buckets carry no state; drop them before adding another
+                self._buckets = {k: b for k, b in self._buckets.items() if b.full_at() > now}
+                bucket = self._buckets[key] = TokenBucket(self.capacity, self.period, now)
+            bucket.take(now)
+
+@shared_resource
+def get_lookup_throttle():
+    return LookupThrottle()
+
+def code_from_scan(scanned):
+    """Numeric code from a scanned QR payload or a typed 8-digit code (None if unreadable)"""
+    scanned = scanned.strip()
+    if scanned.startswith(QR_PAYLOAD_PREFIX):
+        try:
+            return decode_qr_payload(scanned)['code']
+        except (ValueError, TypeError, zlib.error):
+            return None
+    # QR codes printed before the compact payload carried the full JSON record
+    if scanned.startswith('{'):
+        try:
+            return str(json.loads(scanned).get('code') or '') or None
+        except (ValueError, AttributeError):
+            return None
+    return scanned if scanned.isdigit() and len(scanned) == 8 else None
+
+# Create and store a prescription record for a patient
+def save_prescription(user, medicines):
+    """Store a new prescription with a fresh ID and numeric code and return it"""
+    # Generate prescription ID (suffix keeps IDs unique across concurrent users)
+    prescription_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+    
+    # Prepare data
+    prescription_data = {
+        "id": prescription_id,
+        "patient": user['name'],
+        "aadhar": user['aadhar'],
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "medicines": medicines,
+        "code": None
+    }
+    
+    # Save to history, drawing a fresh numeric code on the (rare) collision
+    store = get_prescription_store()
+    for attempt in range(NUMERIC_CODE_ATTEMPTS):
+        prescription_data['code'] = generate_numeric_code()
+        try:
+            with metrics.span('store.add'):
+                store.add(prescription_data)
+            break
+        except DuplicateCodeError:
+            metrics.incr('store.code_collisions')
+            if attempt == NUMERIC_CODE_ATTEMPTS - 1:
+                raise
+    return prescription_data
@@ -0,0 +1,68 @@
+"""Upload handling: small previews, one OCR-sized decode and spooling to disk
+
+Phone photos are often 12+ megapixels. Decoding them at full size for a
+400 px preview and again for OCR (which downscales anyway) costs several
+full-size copies per request, so both decodes ask the JPEG decoder for a
+reduced size up front.
+"""
+import os
+import shutil
+import tempfile
+
+from PIL import Image, ImageOps
+
+from .ocr import OCR_PREPROCESS_CONFIG
+
+UPLOAD_PREVIEW_LONG_EDGE = 600  # pixels; shown at 400 px wide
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get("UPLOAD_SPOOL_THRESHOLD", 4 * 1024 * 1024))
+UPLOAD_COPY_CHUNK = 1024 * 1024
+
+def _draft(image, mode, long_edge):
+    # JPEG only: decode at the smallest 1/2, 1/4 or 1/8 scale still covering long_edge
+    if max(image.size) > long_edge:
+        scale = long_edge / max(image.size)
+        image.draft(mode, (max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+
+def image_preview(source, long_edge=UPLOAD_PREVIEW_LONG_EDGE):
+    """Upright thumbnail of an uploaded image (path or file object)"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    with Image.open(source) as image:
+        _draft(image, 'RGB', long_edge)
+        image.thumbnail((long_edge, long_edge))
+        return ImageOps.exif_transpose(image)
+
+def pdf_preview(pdf_source, dpi=50):
+    """Low-resolution render of the first page for the upload preview"""
+    import pypdfium2 as pdfium
+    
+    if hasattr(pdf_source, 'seek'):
+        pdf_source.seek(0)
+    pdf = pdfium.PdfDocument(pdf_source)
+    try:
+        page = pdf[0]
+        bitmap = page.render(scale=dpi / 72)
+        image = bitmap.to_pil().copy()
+        bitmap.close()
+        page.close()
+        return image, len(pdf)
+    finally:
+        pdf.close()
+
+def decode_for_ocr(source, config=OCR_PREPROCESS_CONFIG):
+    """Decode an uploaded image once, at no more resolution (or colour) than OCR will use"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    image = Image.open(source)
+    if config.get('max_long_edge'):
+        _draft(image, 'L' if config.get('grayscale') else 'RGB', config['max_long_edge'])
+    image.load()
+    return image
+
+def spool_upload(source, threshold=UPLOAD_SPOOL_THRESHOLD):
+    """Copy an upload into a temp file object kept in memory only up to `threshold` bytes"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=threshold)
+    source.seek(0)
+    shutil.copyfileobj(source, spooled, UPLOAD_COPY_CHUNK)
+    spooled.seek(0)
+    return spooled
@@ -0,0 +1,96 @@
+"""Patient directory: Aadhar number -> name and email"""
+import csv
+import os
+import sqlite3
+import threading
+
+from . import APP_DIR
+from .cache import LRUCache, shared_resource
+
+# Demo users, seeded into an empty user directory
+DEMO_USERS = {
+    "123456789012": {"name": "Rahul Kumar", "email": "rahul@example.com"},
+    "234567890123": {"name": "Priya Sharma", "email": "priya@example.com"},
+    "345678901234": {"name": "Amit Patel", "email": "amit@example.com"},
+    "456789012345": {"name": "Sneha Reddy", "email": "sneha@example.com"},
+    "567890123456": {"name": "Rajesh Singh", "email": "rajesh@example.com"}
+}
+
+# User directory: SQLite table indexed by Aadhar and email, with an LRU in front
+USER_DB_PATH = os.environ.get("USER_DB_PATH", os.path.join(APP_DIR, "data", "users.db"))
+USER_CACHE_MAX_ENTRIES = 10000
+USER_IMPORT_BATCH_SIZE = 1000
+
+class UserDirectory:
+    def __init__(self, path, cache_size=USER_CACHE_MAX_ENTRIES):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._cache = LRUCache(cache_size)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                aadhar TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+        """)
+        if self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
+            self._insert_batch([(aadhar, info['name'], info['email']) for aadhar, info in DEMO_USERS.items()])
+
+    def get(self, aadhar):
+        """{'name', 'email'} for an Aadhar number, or None"""
+        user = self._cache.get(aadhar)
+        if user is None:
+            with self._lock:
+                row = self._conn.execute("SELECT name, email FROM users WHERE aadhar = ?", (aadhar,)).fetchone()
+            if row is None:
+                return None
+            user = {'name': row[0], 'email': row[1]}
+            self._cache.put(aadhar, user)
+        return user
+
+    def get_by_email(self, email):
+        """(aadhar, user) pairs registered with an email address"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT aadhar, name, email FROM users WHERE email = ?", (email.strip().lower(),)
+            ).fetchall()
+        return [(row[0], {'name': row[1], 'email': row[2]}) for row in rows]
+
+    def _insert_batch(self, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO users (aadhar, name, email) VALUES (?, ?, ?) "
+                "ON CONFLICT (aadhar) DO UPDATE SET name = excluded.name, email = excluded.email",
+                rows
+            )
+
+    def import_csv(self, path, batch_size=USER_IMPORT_BATCH_SIZE):
+        """Stream aadhar,name,email rows from a CSV in batches; returns (imported, skipped)"""
+        imported = skipped = 0
+        batch = []
+        with open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                aadhar = (row.get('aadhar') or '').strip()
+                name = (row.get('name') or '').strip()
+                if len(aadhar) != 12 or not aadhar.isdigit() or not name:
+                    skipped += 1
+                    continue
+                batch.append((aadhar, name, (row.get('email') or '').strip().lower() or None))
+                if len(batch) >= batch_size:
+                    self._insert_batch(batch)
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self._insert_batch(batch)
+            imported += len(batch)
+        # Imported rows may replace cached users
+        self._cache.clear()
+        return imported, skipped
+
+@shared_resource
+def get_user_directory():
+    return UserDirectory(USER_DB_PATH)
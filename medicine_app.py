@@ -1,19 +1,29 @@
 import streamlit as st
-import qrcode
-from PIL import Image
 import io
 import base64
-from datetime import datetime
-import time
-import pandas as pd
+import hashlib
 import json
-import random
-import easyocr
-import numpy as np
-import re
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import time
+import os
+from datetime import datetime
+
+from dispenser.metrics import metrics, start_exporters
+from dispenser.models import Medicine
+from dispenser.ocr import (
+    OCR_DEFAULT_LANGUAGE, OCR_LANGUAGE_NAMES, OCR_POLL_INTERVAL, OCR_TIMING_COUNTS, start_ocr_warmup,
+)
+from dispenser.otp import (
+    DEMO_OTP, OTP_SMTP_PASSWORD, OTP_SMTP_SENDER, OTP_SMTP_USERNAME, OTPRateLimited,
+    build_otp_message, get_otp_mailer, get_otp_store,
+)
+from dispenser.parsing import MEDICINE_FIELDS, OCR_LOW_CONFIDENCE
+from dispenser.service import (
+    LookupThrottled, cancel_ocr_job, count_prescriptions, counter_lookup, create_prescription, dispense,
+    list_prescriptions, ocr_languages, placeholder_medicines, poll_ocr_job, prescription_qr_png,
+    prescription_summaries, submit_ocr_job, submit_pdf_ocr_job,
+)
+from dispenser.uploads import decode_for_ocr, image_preview, pdf_preview, spool_upload
+from dispenser.users import DEMO_USERS, get_user_directory
 
 # Page config
 st.set_page_config(
@@ -70,212 +80,68 @@ if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 if 'current_user' not in st.session_state:
     st.session_state.current_user = None
-if 'prescriptions' not in st.session_state:
-    st.session_state.prescriptions = []
 if 'current_medicines' not in st.session_state:
     st.session_state.current_medicines = []
 if 'page' not in st.session_state:
     st.session_state.page = 'home'
 if 'otp_sent' not in st.session_state:
     st.session_state.otp_sent = False
-
-# Mock user database with email addresses
-USERS = {
-    "123456789012": {"name": "Rahul Kumar", "email": "rahul@example.com"},
-    "234567890123": {"name": "Priya Sharma", "email": "priya@example.com"},
-    "345678901234": {"name": "Amit Patel", "email": "amit@example.com"},
-    "456789012345": {"name": "Sneha Reddy", "email": "sneha@example.com"},
-    "567890123456": {"name": "Rajesh Singh", "email": "rajesh@example.com"}
-}
+if 'edit_session' not in st.session_state:
+    st.session_state.edit_session = 0
+if 'finalized_prescription' not in st.session_state:
+    st.session_state.finalized_prescription = None
+if 'ocr_job_id' not in st.session_state:
+    st.session_state.ocr_job_id = None
+if 'ocr_language' not in st.session_state:
+    st.session_state.ocr_language = OCR_DEFAULT_LANGUAGE
+if 'upload_preview' not in st.session_state:
+    st.session_state.upload_preview = None
+if 'history_page_number' not in st.session_state:
+    st.session_state.history_page_number = 0
+if 'history_expanded' not in st.session_state:
+    st.session_state.history_expanded = set()
 
 # Email configuration (using session state for security)
+def otp_sender():
+    """(sender_email, credentials) from the session or the server config; None in demo mode"""
+    if 'email_config' in st.session_state:
+        sender_email = st.session_state.email_config['email']
+        return sender_email, (sender_email, st.session_state.email_config['password'])
+    if OTP_SMTP_SENDER:
+        return OTP_SMTP_SENDER, (OTP_SMTP_USERNAME, OTP_SMTP_PASSWORD)
+    return None
+
 def send_otp_email(to_email, otp, user_name):
-    """Send OTP via email using Gmail SMTP"""
-    try:
-        # Get email credentials from Streamlit secrets or use demo mode
-        if 'email_config' in st.session_state:
-            sender_email = st.session_state.email_config['email']
-            sender_password = st.session_state.email_config['password']
-        else:
-            # Demo mode - just simulate sending
-            st.session_state.demo_otp = otp
-            return True, "demo"
-        
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = to_email
-        msg['Subject'] = '🔐 Medicine Dispenser - Your OTP Code'
-        
-        # Email body
-        body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; padding: 20px;">
-            <div style="background: linear-gradient(90deg, #e3f2fd 0%, #bbdefb 100%); padding: 20px; border-radius: 10px;">
-                <h2 style="color: #1e88e5;">💊 Medicine Dispenser</h2>
-                <p>Hello <strong>{user_name}</strong>,</p>
-                <p>Your One-Time Password (OTP) for login is:</p>
-                <div style="background: #fff3e0; padding: 15px; border-radius: 5px; text-align: center; margin: 20px 0;">
-                    <h1 style="color: #1e88e5; font-size: 32px; letter-spacing: 5px;">{otp}</h1>
-                </div>
-                <p>This OTP is valid for 5 minutes.</p>
-                <p style="color: #666; font-size: 12px;">If you didn't request this OTP, please ignore this email.</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        msg.attach(MIMEText(body, 'html'))
-        
-        # Send email
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-        
-        return True, "sent"
-    
-    except Exception as e:
-        st.error(f"Error sending email: {str(e)}")
-        # Fallback to demo mode
-        st.session_state.demo_otp = otp
+    """Queue the OTP email for background delivery; returns (success, mode)"""
+    sender = otp_sender()
+    if sender is None:
+        # Demo mode - just simulate sending
+        st.session_state.otp_delivery_id = None
         return True, "demo"
-
-def generate_otp():
-    """Generate a 6-digit OTP"""
-    return str(random.randint(100000, 999999))
-
-# Initialize EasyOCR reader (cached to avoid reloading)
-@st.cache_resource
-def load_ocr_reader():
-    return easyocr.Reader(['en'], gpu=False)
-
-# Real OCR function with medicine extraction
-def process_prescription_ocr(image):
-    """Extract text from prescription image and parse medicines"""
-    try:
-        # Convert PIL image to numpy array
-        img_array = np.array(image)
-        
-        # Load OCR reader
-        reader = load_ocr_reader()
-        
-        # Perform OCR
-        results = reader.readtext(img_array)
-        
-        # Extract all text
-        full_text = ' '.join([text[1] for text in results])
-        
-        # Parse medicines from text
-        medicines = parse_medicines_from_text(full_text)
-        
-        return medicines
-    except Exception as e:
-        st.error(f"OCR Error: {str(e)}")
-        # Fallback to mock data if OCR fails
-        return mock_ocr_fallback()
-
-def parse_medicines_from_text(text):
-    """Parse medicine information from extracted text"""
-    medicines = []
-    
-    # Common medicine name patterns (you can expand this list)
-    common_medicines = [
-        'paracetamol', 'amoxicillin', 'azithromycin', 'ciprofloxacin',
-        'metformin', 'aspirin', 'ibuprofen', 'omeprazole', 'vitamin',
-        'crocin', 'dolo', 'calpol', 'augmentin', 'pantoprazole'
-    ]
-    
-    # Split text into lines
-    lines = text.lower().split('\n')
-    words = text.lower().split()
-    
-    # Look for medicine names and dosage patterns
-    for i, word in enumerate(words):
-        for med_name in common_medicines:
-            if med_name in word:
-                # Found a medicine, try to extract dosage info
-                dosage = extract_dosage(words, i)
-                frequency = extract_frequency(words, i)
-                duration = extract_duration(words, i)
-                
-                medicines.append({
-                    'name': word.title(),
-                    'dosage': dosage,
-                    'frequency': frequency,
-                    'duration': duration
-                })
-                break
-    
-    # If no medicines found, return default parsing
-    if not medicines:
-        # Try to extract any numbers followed by 'mg', 'ml', etc.
-        pattern = r'(\d+\s*(?:mg|ml|g|mcg|iu))'
-        dosages = re.findall(pattern, text.lower())
-        
-        if dosages:
-            for i, dose in enumerate(dosages[:3]):  # Limit to 3 medicines
-                medicines.append({
-                    'name': f'Medicine {i+1}',
-                    'dosage': dose,
-                    'frequency': '2 times daily',
-                    'duration': '5 days'
-                })
-    
-    # If still no medicines, return at least one blank entry
-    if not medicines:
-        medicines.append({
-            'name': 'Medicine 1',
-            'dosage': '',
-            'frequency': '',
-            'duration': ''
-        })
     
-    return medicines
-
-def extract_dosage(words, index):
-    """Extract dosage from nearby words"""
-    # Look in next 3 words for dosage pattern
-    for i in range(index, min(index + 4, len(words))):
-        if re.search(r'\d+\s*(?:mg|ml|g|mcg|iu)', words[i].lower()):
-            return words[i]
-    return '500mg'  # default
+    sender_email, credentials = sender
+    message = build_otp_message(sender_email, to_email, otp, user_name)
+    st.session_state.otp_delivery_id = get_otp_mailer().submit(credentials, message)
+    return True, "queued"
 
-def extract_frequency(words, index):
-    """Extract frequency from nearby words"""
-    freq_patterns = ['once', 'twice', 'thrice', 'daily', 'times']
-    for i in range(index, min(index + 6, len(words))):
-        if any(pattern in words[i].lower() for pattern in freq_patterns):
-            return ' '.join(words[i:min(i+3, len(words))])
-    return '2 times daily'  # default
+# Only set behind a reverse proxy that appends the real client to X-Forwarded-For;
+# otherwise the header is client-controlled and would dodge the per-IP OTP limit
+TRUST_PROXY_HEADERS = os.environ.get("TRUST_PROXY_HEADERS", "").lower() in ("1", "true", "yes")
 
-def extract_duration(words, index):
-    """Extract duration from nearby words"""
-    for i in range(index, min(index + 8, len(words))):
-        if re.search(r'\d+\s*(?:day|days|week|weeks|month)', words[i].lower()):
-            return words[i]
-    return '5 days'  # default
-
-def mock_ocr_fallback():
-    """Fallback mock data if OCR fails"""
-    return [
-        {"name": "Medicine 1", "dosage": "", "frequency": "", "duration": ""},
-        {"name": "Medicine 2", "dosage": "", "frequency": "", "duration": ""}
-    ]
-
-# Generate QR code
-def generate_qr_code(data):
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(json.dumps(data))
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    # Convert to PIL Image if needed
-    if not isinstance(img, Image.Image):
-        img = img.convert('RGB')
-    return img
-
-# Generate numeric code
-def generate_numeric_code():
-    return ''.join([str(random.randint(0, 9)) for _ in range(8)])
+def client_ip():
+    """Client IP for rate limiting, or None when it cannot be trusted"""
+    context = getattr(st, 'context', None)
+    if context is None:
+        return None
+    ip = getattr(context, 'ip_address', None)
+    if ip:
+        return ip
+    if not TRUST_PROXY_HEADERS:
+        return None
+    # The hop our proxy appended is the last entry; earlier ones come from the client
+    headers = getattr(context, 'headers', None) or {}
+    forwarded = headers.get('X-Forwarded-For', '')
+    return forwarded.split(',')[-1].strip() or None
 
 # Convert image to base64
 def img_to_base64(img):
@@ -283,6 +149,52 @@ def img_to_base64(img):
     img.save(buffered, format="PNG")
     return base64.b64encode(buffered.getvalue()).decode()
 
+# Finalize the current edit session into a prescription record (once)
+def finalize_prescription():
+    """Create the record, ID, code and QR bytes once; reruns reuse the stored result"""
+    # OCR confidences are review-only metadata and stay out of the record
+    medicines = [{field: med.get(field, '') for field in MEDICINE_FIELDS}
+                 for med in st.session_state.current_medicines]
+    fingerprint = hashlib.sha256(json.dumps(medicines, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    finalized = st.session_state.finalized_prescription
+    if (finalized is not None
+            and finalized['edit_session'] == st.session_state.edit_session
+            and finalized['fingerprint'] == fingerprint):
+        return finalized
+    
+    prescription = create_prescription(st.session_state.current_user['aadhar'],
+                                       [Medicine.from_dict(med) for med in medicines])
+    
+    finalized = {
+        'edit_session': st.session_state.edit_session,
+        'fingerprint': fingerprint,
+        'prescription': prescription.to_dict(),
+        # Generate QR code (PNG bytes, cached by payload hash)
+        'qr_png': prescription_qr_png(prescription)
+    }
+    st.session_state.finalized_prescription = finalized
+    return finalized
+
+# Sign out and forget everything tied to the user, so the next person on
+# this browser session never sees (or saves) the previous user's work
+def logout():
+    if st.session_state.ocr_job_id:
+        cancel_ocr_job(st.session_state.ocr_job_id)
+    for key in ('ocr_timings', 'ocr_error', 'temp_aadhar', 'otp_delivery_id'):
+        st.session_state.pop(key, None)
+    st.session_state.authenticated = False
+    st.session_state.current_user = None
+    st.session_state.current_medicines = []
+    st.session_state.page = 'home'
+    st.session_state.otp_sent = False
+    st.session_state.edit_session += 1
+    st.session_state.finalized_prescription = None
+    st.session_state.ocr_job_id = None
+    st.session_state.upload_preview = None
+    st.session_state.history_page_number = 0
+    st.session_state.history_expanded = set()
+
 # Login page
 def login_page():
     st.markdown("<div class='main-header'>💊 Medicine Dispenser - Login</div>", unsafe_allow_html=True)
@@ -311,67 +223,86 @@ def login_page():
         
         with st.expander("📋 Test Users"):
             st.write("**Available Test Users:**")
-            for aadhar, info in USERS.items():
+            for aadhar, info in DEMO_USERS.items():
                 email_display = info.get('email', 'N/A')
                 st.write(f"- **{info['name']}**")
                 st.write(f"  Aadhar: `{aadhar}` | Email: `{email_display}`")
             
-            if 'email_config' not in st.session_state:
-                st.info("📧 **Demo Mode Active:** Use OTP `123456` for any user")
+            if otp_sender() is None:
+                st.info(f"📧 **Demo Mode Active:** Use OTP `{DEMO_OTP}` for any user")
         
         st.markdown("---")
         
         aadhar = st.text_input("Enter Aadhar Number (12 digits)", max_chars=12)
         
         if st.button("📧 Send OTP", type="primary", use_container_width=True):
-            if len(aadhar) == 12 and aadhar in USERS:
-                # Generate OTP
-                otp = generate_otp()
+            user = get_user_directory().get(aadhar) if len(aadhar) == 12 else None
+            if user is not None:
+                # Generate OTP (stored server-side with its expiry); the demo
+                # OTP only works for OTPs that are not emailed anywhere
+                try:
+                    otp = get_otp_store().issue(aadhar, client_ip(), demo=otp_sender() is None)
+                except OTPRateLimited as e:
+                    st.error(f"⏳ {e}")
+                    return
                 
-                # Store OTP and timestamp
-                st.session_state.generated_otp = otp
-                st.session_state.otp_timestamp = datetime.now()
                 st.session_state.otp_sent = True
                 st.session_state.temp_aadhar = aadhar
                 
                 # Send OTP via email
-                user_email = USERS[aadhar].get('email', 'demo@example.com')
-                user_name = USERS[aadhar]['name']
+                user_email = user.get('email') or 'demo@example.com'
+                user_name = user['name']
                 
-                with st.spinner("📤 Sending OTP..."):
-                    success, mode = send_otp_email(user_email, otp, user_name)
+                success, mode = send_otp_email(user_email, otp, user_name)
                 
                 if success:
                     if mode == "demo":
                         st.success(f"✅ **Demo Mode:** OTP sent to {user_name}")
-                        st.info(f"🔑 **Demo OTP:** `123456` (or use the generated OTP: `{otp}`)")
+                        st.info(f"🔑 **Demo OTP:** `{DEMO_OTP}` (or use the generated OTP: `{otp}`)")
                     else:
-                        st.success(f"✅ OTP sent to {user_email} for {user_name}")
+                        st.success(f"✅ Sending OTP to {user_email} for {user_name}")
                         st.info("📧 Check your email inbox (and spam folder)")
             else:
                 st.error("❌ Invalid Aadhar number")
         
         if st.session_state.otp_sent:
             st.markdown("---")
+            
+            # Email delivery runs in the background; show its latest status
+            if st.session_state.get('otp_delivery_id'):
+                delivery = get_otp_mailer().status(st.session_state.otp_delivery_id)
+                if delivery is None or delivery['status'] in ('queued', 'sending'):
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.caption("📤 Sending OTP email...")
+                    with col2:
+                        st.button("🔄 Refresh", key="otp_delivery_refresh")
+                elif delivery['status'] == 'sent':
+                    st.caption("📧 OTP email delivered to the mail server")
+                else:
+                    st.error(f"Error sending email: {delivery['error']}")
+                    st.info("🔁 Check the email configuration and request a new OTP")
+            
             otp_input = st.text_input("Enter OTP", max_chars=6, type="password")
             
             if st.button("🔓 Verify & Login", type="primary", use_container_width=True):
-                # Check if OTP is expired (5 minutes validity)
-                if 'otp_timestamp' in st.session_state:
-                    elapsed = (datetime.now() - st.session_state.otp_timestamp).total_seconds()
-                    if elapsed > 300:  # 5 minutes
-                        st.error("❌ OTP expired. Please request a new one.")
-                        st.session_state.otp_sent = False
-                        return
+                # Verify OTP (the store accepts the demo OTP only in demo mode)
+                result = get_otp_store().verify(st.session_state.temp_aadhar, otp_input)
                 
-                # Verify OTP (accept both generated OTP and demo OTP)
-                valid_otps = [st.session_state.get('generated_otp', ''), '123456']
+                if result == 'expired':
+                    st.error("❌ OTP expired. Please request a new one.")
+                    st.session_state.otp_sent = False
+                    return
+                if result == 'locked':
+                    st.error("❌ Too many wrong attempts. Please request a new OTP.")
+                    st.session_state.otp_sent = False
+                    return
                 
-                if otp_input in valid_otps:
+                if result == 'ok':
                     st.session_state.authenticated = True
                     st.session_state.current_user = {
                         'aadhar': st.session_state.temp_aadhar,
-                        'name': USERS[st.session_state.temp_aadhar]['name']
+                        'name': get_user_directory().get(st.session_state.temp_aadhar)['name']
                     }
                     st.session_state.otp_sent = False
                     st.success("✅ Login successful!")
@@ -387,7 +318,7 @@ def home_page():
     # Quick stats
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Prescriptions", len(st.session_state.prescriptions))
+        st.metric("Total Prescriptions", count_prescriptions(st.session_state.current_user['aadhar']))
     with col2:
         st.metric("Status", "✅ Active")
     with col3:
@@ -421,6 +352,34 @@ def upload_page():
         st.session_state.page = 'home'
         st.rerun()
     
+    # Poll a running OCR job with short reruns instead of blocking the script
+    if st.session_state.ocr_job_id:
+        job = poll_ocr_job(st.session_state.ocr_job_id)
+        
+        if job is None:
+            st.session_state.ocr_job_id = None
+        elif job['status'] in ('queued', 'running'):
+            st.progress(job['progress'], text=f"🔄 {job['message']}... This may take 30-60 seconds on first run...")
+            if st.button("✖️ Cancel"):
+                cancel_ocr_job(st.session_state.ocr_job_id)
+                st.session_state.ocr_job_id = None
+                st.rerun()
+            time.sleep(OCR_POLL_INTERVAL)
+            st.rerun()
+        else:
+            if job['status'] == 'failed':
+                st.session_state.ocr_error = job['error']
+                # Fallback to mock data if OCR fails
+                medicines = placeholder_medicines()
+            else:
+                medicines = job['result']
+            st.session_state.ocr_job_id = None
+            st.session_state.ocr_timings = dict(job['timings'])
+            st.session_state.current_medicines = [med.to_dict() for med in medicines]
+            st.session_state.edit_session += 1
+            st.session_state.page = 'edit'
+            st.rerun()
+    
     st.info("📸 Upload a photo of your prescription or use your camera to capture it")
     
     uploaded_file = st.file_uploader("Choose prescription image", type=['jpg', 'jpeg', 'png', 'pdf'])
@@ -431,25 +390,67 @@ def upload_page():
     image_to_process = uploaded_file or camera_photo
     
     if image_to_process:
-        # Display preview
+        is_pdf = image_to_process.type == "application/pdf"
+        
+        # Display a small preview, decoded once per upload rather than on every rerun
         st.markdown("### 👁️ Prescription Preview")
-        if image_to_process.type != "application/pdf":
-            image = Image.open(image_to_process)
-            st.image(image, width=400)
+        preview = st.session_state.upload_preview
+        if preview is None or preview['file_id'] != image_to_process.file_id:
+            preview = None
+            try:
+                with metrics.span('upload.preview'):
+                    if is_pdf:
+                        image, page_count = pdf_preview(image_to_process)
+                        caption = f"Page 1 of {page_count}"
+                    else:
+                        image, caption = image_preview(image_to_process), None
+                preview = {'file_id': image_to_process.file_id, 'image': image, 'caption': caption}
+                st.session_state.upload_preview = preview
+            except ImportError:
+                st.warning("PDF support needs the `pypdfium2` package. Please upload an image (JPG/PNG).")
+            except Exception as e:
+                st.error(f"Could not read {'PDF' if is_pdf else 'image'}: {str(e)}")
+        if preview is not None:
+            st.image(preview['image'], width=400, caption=preview['caption'])
+        
+        # Only languages with local weights are offered; each loads just its own model
+        languages = ocr_languages()
+        if st.session_state.ocr_language not in languages:
+            st.session_state.ocr_language = languages[0]
+        if len(languages) > 1:
+            st.session_state.ocr_language = st.selectbox(
+                "🌐 Prescription language", languages, format_func=OCR_LANGUAGE_NAMES.get,
+                index=languages.index(st.session_state.ocr_language))
+        language = st.session_state.ocr_language
         
         if st.button("🔍 Process Prescription", type="primary"):
-            with st.spinner("🔄 Analyzing prescription with OCR... This may take 30-60 seconds on first run..."):
-                # Convert to PIL Image if needed
-                if image_to_process.type != "application/pdf":
-                    image = Image.open(image_to_process)
-                else:
-                    st.error("PDF processing not yet supported. Please upload an image (JPG/PNG).")
-                    return
-                
-                medicines = process_prescription_ocr(image)
-                st.session_state.current_medicines = medicines
-                st.session_state.page = 'edit'
+            # PDFs are rasterized page by page inside the OCR job, read from
+            # a spooled copy (on disk when large) rather than the upload buffer
+            if is_pdf:
+                st.session_state.ocr_job_id = submit_pdf_ocr_job(spool_upload(image_to_process), language)
                 st.rerun()
+            
+            # Decode once, at OCR resolution, now so the worker thread never
+            # touches the upload stream
+            with metrics.span('upload.decode'):
+                image = decode_for_ocr(image_to_process)
+            st.session_state.ocr_job_id = submit_ocr_job(image, language)
+            st.rerun()
+
+# Low-confidence OCR fields are highlighted for review on the edit page
+def field_needs_review(med, field):
+    return med.get('confidence', {}).get(field, 1.0) < OCR_LOW_CONFIDENCE
+
+def field_label(med, field, label):
+    return f"⚠️ {label}" if field_needs_review(med, field) else label
+
+def field_help(med, field):
+    if not field_needs_review(med, field):
+        return None
+    confidence = med['confidence'][field]
+    if confidence == 0.0:
+        return "Not found on the prescription - a default was filled in"
+    return f"OCR confidence {confidence:.0%} - please check"
 
 # Edit medicines page
 def edit_page():
@@ -459,18 +460,38 @@ def edit_page():
         st.session_state.page = 'upload'
         st.rerun()
     
-    st.success("✅ Prescription processed successfully! Review the medicines below:")
+    if st.session_state.get('ocr_error'):
+        st.error(f"OCR Error: {st.session_state.pop('ocr_error')}")
+    else:
+        st.success("✅ Prescription processed successfully! Review the medicines below:")
+    
+    if st.session_state.get('ocr_timings'):
+        timings = st.session_state.ocr_timings
+        st.caption("⏱️ " + " | ".join(
+            f"{step}: {value}" if step in OCR_TIMING_COUNTS else f"{step}: {value:.0f} ms"
+            for step, value in timings.items()
+        ))
+        if timings.get('failed_pages'):
+            st.warning(f"⚠️ {timings['failed_pages']} page(s) could not be read; medicines from them are missing.")
+    
+    if any(field_needs_review(med, field) for med in st.session_state.current_medicines for field in MEDICINE_FIELDS):
+        st.warning("⚠️ Fields marked ⚠️ were hard to read or not found on the prescription. Please check them.")
     
     # Display and edit medicines
     for i, med in enumerate(st.session_state.current_medicines):
-        with st.expander(f"💊 {med['name']}", expanded=True):
+        flagged = any(field_needs_review(med, field) for field in MEDICINE_FIELDS)
+        with st.expander(f"{'⚠️' if flagged else '💊'} {med['name']}", expanded=True):
             col1, col2 = st.columns(2)
             with col1:
-                med['name'] = st.text_input("Medicine Name", value=med['name'], key=f"name_{i}")
-                med['dosage'] = st.text_input("Dosage", value=med['dosage'], key=f"dose_{i}")
+                med['name'] = st.text_input(field_label(med, 'name', "Medicine Name"), value=med['name'],
+                                            key=f"name_{i}", help=field_help(med, 'name'))
+                med['dosage'] = st.text_input(field_label(med, 'dosage', "Dosage"), value=med['dosage'],
+                                              key=f"dose_{i}", help=field_help(med, 'dosage'))
             with col2:
-                med['frequency'] = st.text_input("Frequency", value=med['frequency'], key=f"freq_{i}")
-                med['duration'] = st.text_input("Duration", value=med['duration'], key=f"dur_{i}")
+                med['frequency'] = st.text_input(field_label(med, 'frequency', "Frequency"), value=med['frequency'],
+                                                 key=f"freq_{i}", help=field_help(med, 'frequency'))
+                med['duration'] = st.text_input(field_label(med, 'duration', "Duration"), value=med['duration'],
+                                                key=f"dur_{i}", help=field_help(med, 'duration'))
             
             if st.button(f"🗑️ Delete {med['name']}", key=f"del_{i}"):
                 st.session_state.current_medicines.pop(i)
@@ -497,44 +518,27 @@ def edit_page():
 
 # QR code display page
 def qr_page():
-    st.markdown("<div class='main-header'>✅ QR Code Generated</div>", unsafe_allow_html=True)
-    
-    # Generate prescription ID
-    prescription_id = datetime.now().strftime("%Y%m%d%H%M%S")
-    numeric_code = generate_numeric_code()
-    
-    # Prepare data
-    prescription_data = {
-        "id": prescription_id,
-        "patient": st.session_state.current_user['name'],
-        "aadhar": st.session_state.current_user['aadhar'],
-        "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        "medicines": st.session_state.current_medicines,
-        "code": numeric_code
-    }
+    import pandas as pd  # only pages with tables pay for pandas
     
-    # Save to history
-    st.session_state.prescriptions.append(prescription_data)
+    st.markdown("<div class='main-header'>✅ QR Code Generated</div>", unsafe_allow_html=True)
     
-    # Generate QR code
-    qr_img = generate_qr_code(prescription_data)
+    # Reruns (e.g. the download button) only redisplay the stored artifact
+    finalized = finalize_prescription()
+    prescription_data = finalized['prescription']
+    prescription_id = prescription_data['id']
+    numeric_code = prescription_data['code']
+    qr_png = finalized['qr_png']
     
     col1, col2 = st.columns([1, 1])
     
     with col1:
         st.markdown("### 📱 Scan QR Code")
-        # Convert QR image to bytes for display
-        buf = io.BytesIO()
-        qr_img.save(buf, format='PNG')
-        buf.seek(0)
-        st.image(buf, width=300)
+        st.image(qr_png, width=300)
         
         # Download button
-        buf2 = io.BytesIO()
-        qr_img.save(buf2, format='PNG')
         st.download_button(
             label="💾 Download QR Code",
-            data=buf2.getvalue(),
+            data=qr_png,
             file_name=f"prescription_{prescription_id}.png",
             mime="image/png"
         )
@@ -547,12 +551,12 @@ def qr_page():
         st.markdown("### 📋 Prescription Summary")
         st.write(f"**ID:** {prescription_id}")
         st.write(f"**Date:** {prescription_data['date']}")
-        st.write(f"**Medicines:** {len(st.session_state.current_medicines)}")
+        st.write(f"**Medicines:** {len(prescription_data['medicines'])}")
     
     # Medicine list
     st.markdown("---")
     st.markdown("### 💊 Medicine Details")
-    df = pd.DataFrame(st.session_state.current_medicines)
+    df = pd.DataFrame(prescription_data['medicines'])
     st.dataframe(df, use_container_width=True)
     
     st.markdown("---")
@@ -560,44 +564,188 @@ def qr_page():
     
     if st.button("🏠 Back to Home", type="primary"):
         st.session_state.current_medicines = []
+        st.session_state.finalized_prescription = None
         st.session_state.page = 'home'
         st.rerun()
 
 # History page
+HISTORY_PAGE_SIZES = [10, 20, 50, 100]
+
 def history_page():
+    import pandas as pd
+    
     st.markdown("<div class='main-header'>📋 Prescription History</div>", unsafe_allow_html=True)
     
     if st.button("⬅️ Back to Home"):
         st.session_state.page = 'home'
         st.rerun()
     
-    if len(st.session_state.prescriptions) == 0:
+    aadhar = st.session_state.current_user['aadhar']
+    total = count_prescriptions(aadhar)
+    
+    if total == 0:
         st.info("📭 No prescriptions found. Upload your first prescription to get started!")
-    else:
-        st.success(f"📊 Total Prescriptions: {len(st.session_state.prescriptions)}")
+        return
+    
+    st.success(f"📊 Total Prescriptions: {total}")
+    
+    # Compact summary of the whole history, built as one DataFrame
+    if st.toggle("📊 Show summary table"):
+        summary = pd.DataFrame.from_records(
+            prescription_summaries(aadhar), columns=["Prescription ID", "Date", "Numeric Code", "Medicines"]
+        )
+        st.dataframe(summary, use_container_width=True, hide_index=True)
+    
+    # Pagination
+    page_size = st.selectbox("Prescriptions per page", HISTORY_PAGE_SIZES, key="history_page_size")
+    page_count = (total + page_size - 1) // page_size
+    page_number = min(st.session_state.history_page_number, page_count - 1)
+    
+    # Display in reverse chronological order; QR codes and medicine tables are
+    # only built for the entries the user has opened
+    for prescription in list_prescriptions(aadhar, limit=page_size, offset=page_number * page_size):
+        expanded = prescription.id in st.session_state.history_expanded
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.markdown(f"🗓️ **{prescription.date}** - {len(prescription.medicines)} medicines")
+        with col2:
+            if st.button("▾ Hide" if expanded else "▸ Show", key=f"history_toggle_{prescription.id}",
+                         use_container_width=True):
+                st.session_state.history_expanded ^= {prescription.id}
+                st.rerun()
         
-        # Display in reverse chronological order
-        for prescription in reversed(st.session_state.prescriptions):
-            with st.expander(f"🗓️ {prescription['date']} - {len(prescription['medicines'])} medicines"):
+        if expanded:
+            with st.container(border=True):
                 col1, col2 = st.columns([1, 2])
                 
                 with col1:
-                    qr_img = generate_qr_code(prescription)
-                    buf = io.BytesIO()
-                    qr_img.save(buf, format='PNG')
-                    buf.seek(0)
-                    st.image(buf, width=200)
+                    st.image(prescription_qr_png(prescription), width=200)
                 
                 with col2:
-                    st.write(f"**Prescription ID:** {prescription['id']}")
-                    st.write(f"**Numeric Code:** {prescription['code']}")
-                    st.write(f"**Date:** {prescription['date']}")
+                    st.write(f"**Prescription ID:** {prescription.id}")
+                    st.write(f"**Numeric Code:** {prescription.code}")
+                    st.write(f"**Date:** {prescription.date}")
                     st.markdown("**Medicines:**")
-                    df = pd.DataFrame(prescription['medicines'])
+                    df = pd.DataFrame(prescription.to_dict()['medicines'])
                     st.dataframe(df, use_container_width=True)
+    
+    if page_count > 1:
+        st.markdown("---")
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬅️ Newer", disabled=page_number == 0, use_container_width=True):
+                st.session_state.history_page_number = page_number - 1
+                st.rerun()
+        with col2:
+            st.markdown(f"<div style='text-align: center;'>Page {page_number + 1} of {page_count}</div>",
+                        unsafe_allow_html=True)
+        with col3:
+            if st.button("Older ➡️", disabled=page_number >= page_count - 1, use_container_width=True):
+                st.session_state.history_page_number = page_number + 1
+                st.rerun()
+
+# Pharmacist counter page: look up and dispense by QR scan or numeric code.
+# Only users listed in PHARMACISTS may open it
+PHARMACISTS = {aadhar.strip() for aadhar in os.environ.get("PHARMACISTS", "").split(",") if aadhar.strip()}
+
+def is_pharmacist():
+    """Users listed in PHARMACISTS (nobody when it is unset)"""
+    return st.session_state.current_user['aadhar'] in PHARMACISTS
+
+def lookup_page():
+    import pandas as pd
+    
+    st.markdown("<div class='main-header'>💊 Pharmacist Counter</div>", unsafe_allow_html=True)
+    
+    if st.button("⬅️ Back to Home"):
+        st.session_state.page = 'home'
+        st.rerun()
+    
+    scanned = st.text_input("Scan QR code or enter the 8-digit numeric code")
+    if scanned:
+        try:
+            prescription = counter_lookup(scanned, st.session_state.current_user['aadhar'])
+        except LookupThrottled as e:
+            st.error(f"⏳ {e}")
+            return
+        
+        if prescription is None:
+            st.error("❌ No prescription found for this code")
+            return
+        
+        st.write(f"**Patient:** {prescription.patient}")
+        st.write(f"**Prescription ID:** {prescription.id}")
+        st.write(f"**Numeric Code:** {prescription.code}")
+        st.write(f"**Date:** {prescription.date}")
+        st.markdown("**Medicines:**")
+        st.dataframe(pd.DataFrame(prescription.to_dict()['medicines']), use_container_width=True)
+        
+        if prescription.dispensed_at is not None:
+            st.warning(f"⚠️ Already dispensed on {datetime.fromtimestamp(prescription.dispensed_at):%Y-%m-%d %H:%M}")
+        elif st.button("💊 Mark as Dispensed", type="primary", use_container_width=True):
+            dispensed_now, _ = dispense(prescription.code)
+            if dispensed_now:
+                st.success("✅ Prescription dispensed")
+            else:
+                st.error("❌ This prescription was dispensed at another counter")
+
+# Metrics page: recent per-stage latency percentiles, counters and memory
+METRICS_ADMINS = {aadhar.strip() for aadhar in os.environ.get("METRICS_ADMINS", "").split(",") if aadhar.strip()}
+
+def is_metrics_admin():
+    """Users listed in METRICS_ADMINS (nobody when it is unset)"""
+    return st.session_state.current_user['aadhar'] in METRICS_ADMINS
+
+def metrics_page():
+    import pandas as pd
+    
+    st.markdown("<div class='main-header'>📈 Metrics</div>", unsafe_allow_html=True)
+    
+    if st.button("⬅️ Back to Home"):
+        st.session_state.page = 'home'
+        st.rerun()
+    
+    snapshot = metrics.snapshot()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Uptime", f"{snapshot['uptime_s'] / 60:.0f} min")
+    with col2:
+        st.metric("Peak memory (RSS)", f"{snapshot['memory']['peak_rss_bytes'] / 2 ** 20:.0f} MB")
+    with col3:
+        st.metric("OCR jobs", snapshot['counters'].get('ocr.jobs.submitted', 0))
+    
+    st.markdown("### ⏱️ Stages")
+    st.caption(f"Percentiles over the last {metrics.window} samples of each stage")
+    if snapshot['stages']:
+        st.dataframe(pd.DataFrame.from_dict(snapshot['stages'], orient='index'), use_container_width=True)
+    else:
+        st.info("Nothing recorded yet")
+    
+    st.markdown("### 🔢 Counters")
+    if snapshot['counters']:
+        st.dataframe(pd.DataFrame(list(snapshot['counters'].items()), columns=['counter', 'value']),
+                     use_container_width=True, hide_index=True)
+    
+    st.markdown("### 🧠 Memory high-water marks")
+    st.caption("Stages that were running when the process peak RSS went up")
+    st.dataframe(pd.DataFrame([(stage, f"{rss / 2 ** 20:.0f} MB")
+                               for stage, rss in snapshot['memory']['peak_raised_by'].items()],
+                              columns=['stage', 'peak RSS']),
+                 use_container_width=True, hide_index=True)
+    
+    st.download_button("⬇️ Prometheus text", metrics.prometheus_text(), file_name="metrics.txt")
 
 # Main app logic
 def main():
+    try:
+        render_page()
+    finally:
+        # Load the OCR models in the background once the page has been drawn,
+        # so the first paint never waits on torch
+        start_ocr_warmup()
+        start_exporters()
+
+def render_page():
     if not st.session_state.authenticated:
         login_page()
     else:
@@ -619,12 +767,18 @@ def main():
                 st.session_state.page = 'history'
                 st.rerun()
             
+            if is_pharmacist() and st.button("💊 Pharmacist Counter", use_container_width=True):
+                st.session_state.page = 'lookup'
+                st.rerun()
+            
+            if is_metrics_admin() and st.button("📈 Metrics", use_container_width=True):
+                st.session_state.page = 'metrics'
+                st.rerun()
+            
             st.markdown("---")
             
             if st.button("🚪 Logout", use_container_width=True):
-                st.session_state.authenticated = False
-                st.session_state.current_user = None
-                st.session_state.page = 'home'
+                logout()
                 st.rerun()
         
         # Display current page
@@ -638,6 +792,10 @@ def main():
             qr_page()
         elif st.session_state.page == 'history':
             history_page()
+        elif st.session_state.page == 'lookup' and is_pharmacist():
+            lookup_page()
+        elif st.session_state.page == 'metrics' and is_metrics_admin():
+            metrics_page()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()